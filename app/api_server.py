@@ -0,0 +1,207 @@
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import sys
+import threading
+
+import uvicorn
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
+
+# Add the root directory to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.query_app import (circuit_breakers, config, get_openai_client, get_semantic_cache, prepare_log_backend,
+                           process_user_query, process_user_query_stream)
+# query_app imports its sibling modules by their top-level names; do the same so the metrics are shared
+from tracing import render_metrics
+from worker_pool import PoolOverloaded, QueryWorkerPool
+
+API_SERVER_CONFIG = config.get("api_server", {})
+API_HOST = API_SERVER_CONFIG.get("host", "0.0.0.0")
+API_PORT = API_SERVER_CONFIG.get("port", 8080)
+API_REQUEST_TIMEOUT = API_SERVER_CONFIG.get("request_timeout", 120)
+API_BATCH_MAX_SIZE = API_SERVER_CONFIG.get("batch_max_size", 50)
+API_RETRY_AFTER = API_SERVER_CONFIG.get("retry_after", 2)
+
+worker_pool = QueryWorkerPool(max_workers=API_SERVER_CONFIG.get("workers", 8),
+                              max_queue=API_SERVER_CONFIG.get("max_queue", 32))
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    # The OpenAI client, the semantic cache and the local log index are loaded lazily; load them before the
+    # first request
+    await asyncio.to_thread(get_openai_client)
+    await asyncio.to_thread(get_semantic_cache)
+    await asyncio.to_thread(prepare_log_backend)
+    yield
+    worker_pool.shutdown(wait=False)
+
+
+app = FastAPI(title="Observability Monkey", lifespan=lifespan)
+
+
+class QueryRequest(BaseModel):
+    query: str
+
+
+class BatchRequest(BaseModel):
+    queries: list[str]
+
+
+@app.exception_handler(PoolOverloaded)
+async def handle_overload(request, exc):
+    return JSONResponse(status_code=429, content={"detail": f"Server is busy: {exc}"},
+                        headers={"Retry-After": str(API_RETRY_AFTER)})
+
+
+def validate_query(query):
+    if not query.strip():
+        raise HTTPException(status_code=400, detail="query must not be empty")
+
+
+@app.post("/query")
+async def query(request: QueryRequest):
+    validate_query(request.query)
+    future = worker_pool.submit(process_user_query, request.query)
+    try:
+        response = await asyncio.wait_for(asyncio.wrap_future(future), API_REQUEST_TIMEOUT)
+    except asyncio.TimeoutError:
+        worker_pool.abandon([future])
+        raise HTTPException(status_code=504, detail=f"query did not finish within {API_REQUEST_TIMEOUT}s")
+    return {"query": request.query, "response": response}
+
+
+def format_sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class StreamStopped(Exception):
+    pass
+
+
+@app.post("/query/stream")
+async def query_stream(request: QueryRequest):
+    # Server-sent events: "status" per pipeline stage, "token" per answer chunk, then "done" or "error".
+    # The whole stream gets request_timeout; once the client is gone or the deadline has passed, the job
+    # stops at its next pipeline stage or answer token.
+    validate_query(request.query)
+    loop = asyncio.get_running_loop()
+    events = asyncio.Queue()
+    disconnected = threading.Event()
+
+    def publish(event, data):
+        loop.call_soon_threadsafe(events.put_nowait, (event, data))
+
+    def report_status(label):
+        if disconnected.is_set():
+            raise StreamStopped()  # Nobody is waiting for the answer, so the LLM is not called
+        publish("status", label)
+
+    def run_stream():
+        stream = process_user_query_stream(request.query, on_status=report_status)
+        try:
+            for token in stream:
+                if disconnected.is_set():
+                    break
+                publish("token", token)
+            publish("done", None)
+        except StreamStopped:
+            logging.info("Stopped streaming an answer nobody is waiting for: %r", request.query)
+        except Exception as e:
+            logging.error(f"Error streaming answer for {request.query!r}: {e}")
+            publish("error", str(e))
+        finally:
+            stream.close()
+
+    # Admission happens before the response starts so overload still surfaces as a 429
+    future = worker_pool.submit(run_stream)
+
+    async def event_stream():
+        deadline = loop.time() + API_REQUEST_TIMEOUT
+        try:
+            while True:
+                try:
+                    event, data = await asyncio.wait_for(events.get(), max(deadline - loop.time(), 0))
+                except asyncio.TimeoutError:
+                    worker_pool.abandon([future])
+                    yield format_sse("error", f"query did not finish within {API_REQUEST_TIMEOUT}s")
+                    return
+                yield format_sse(event, data)
+                if event in ("done", "error"):
+                    return
+        finally:
+            disconnected.set()
+            future.cancel()  # Still queued: never starts, and its slot is given back
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.post("/batch")
+async def batch(request: BatchRequest):
+    if len(request.queries) > API_BATCH_MAX_SIZE:
+        raise HTTPException(status_code=413, detail=f"at most {API_BATCH_MAX_SIZE} queries per batch")
+    for user_query in request.queries:
+        validate_query(user_query)
+
+    futures = worker_pool.submit_many(process_user_query, request.queries)
+    try:
+        outcomes = await asyncio.wait_for(asyncio.gather(*map(asyncio.wrap_future, futures), return_exceptions=True),
+                                          API_REQUEST_TIMEOUT)
+    except asyncio.TimeoutError:
+        worker_pool.abandon(futures)
+        raise HTTPException(status_code=504, detail=f"batch did not finish within {API_REQUEST_TIMEOUT}s")
+
+    results = []
+    for user_query, outcome in zip(request.queries, outcomes):
+        if isinstance(outcome, Exception):
+            logging.error(f"Batch query {user_query!r} failed: {outcome}")
+            results.append({"query": user_query, "error": str(outcome)})
+        else:
+            results.append({"query": user_query, "response": outcome})
+    return {"results": results}
+
+
+@app.get("/health")
+async def health():
+    semantic_cache = get_semantic_cache()
+    return {"status": "ok", "workers": worker_pool.stats(),
+            "semantic_cache": semantic_cache.stats() if semantic_cache else None,
+            "circuit_breakers": {name: breaker.stats() for name, breaker in circuit_breakers.items()}}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    stats = worker_pool.stats()
+    lines = [render_metrics().rstrip("\n")]
+    for name in ("running", "queued", "abandoned", "capacity"):
+        lines.append(f"# TYPE observability_monkey_worker_pool_{name} gauge")
+        lines.append(f"observability_monkey_worker_pool_{name} {stats[name]}")
+    for name in ("rejected", "timed_out"):
+        lines.append(f"# TYPE observability_monkey_worker_pool_{name}_total counter")
+        lines.append(f"observability_monkey_worker_pool_{name}_total {stats[name]}")
+    semantic_cache = get_semantic_cache()
+    if semantic_cache:
+        cache_stats = semantic_cache.stats()
+        for name in ("hits", "misses", "rejected", "evictions"):
+            lines.append(f"# TYPE observability_monkey_semantic_cache_{name}_total counter")
+            lines.append(f"observability_monkey_semantic_cache_{name}_total {cache_stats[name]}")
+        lines.append("# TYPE observability_monkey_semantic_cache_memory_bytes gauge")
+        lines.append(f"observability_monkey_semantic_cache_memory_bytes {cache_stats['memory_bytes']}")
+    lines.append("# TYPE observability_monkey_circuit_breaker_open gauge")
+    for name, breaker in sorted(circuit_breakers.items()):
+        lines.append(f'observability_monkey_circuit_breaker_open{{backend="{name}"}} {int(breaker.state != "closed")}')
+    return "\n".join(lines) + "\n"
+
+
+def main():
+    uvicorn.run(app, host=API_HOST, port=API_PORT)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+import concurrent.futures
+import json
+import logging
+import os
+import time
+
+
+def load_batch_questions(input_path):
+    # Accepts test/input.json style {"questions": [...]}, a plain JSON list, or NDJSON with one
+    # question per line. Questions are strings or objects with "query"/"question" and an optional "id".
+    with open(input_path, "r") as f:
+        content = f.read()
+    stripped = content.lstrip()
+    if input_path.endswith(".ndjson") or input_path.endswith(".jsonl") or not stripped.startswith(("{", "[")):
+        items = [json.loads(line) for line in content.splitlines() if line.strip()]
+    else:
+        try:
+            data = json.loads(content)
+            items = data.get("questions", []) if isinstance(data, dict) else data
+        except ValueError:
+            # A file of one JSON object per line that happens to start with "{"
+            items = [json.loads(line) for line in content.splitlines() if line.strip()]
+
+    questions = []
+    for position, item in enumerate(items):
+        if isinstance(item, str):
+            item = {"query": item}
+        query = item.get("query") or item.get("question")
+        if not query:
+            logging.warning("Skipping batch entry %d without a query", position)
+            continue
+        questions.append({"id": str(item.get("id", position)), "query": query})
+    return questions
+
+
+def load_completed_ids(output_path):
+    # The output file doubles as the checkpoint: every line with a response is done
+    completed = set()
+    if not os.path.exists(output_path):
+        return completed
+    with open(output_path, "r") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                continue  # A line cut short by an interrupted run
+            if "response" in result:
+                completed.add(str(result["id"]))
+    return completed
+
+
+def ends_with_newline(path):
+    with open(path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+def run_batch(questions, output_path, process, parallelism=4, resume=False):
+    completed = load_completed_ids(output_path) if resume else set()
+    pending = [question for question in questions if question["id"] not in completed]
+    logging.info("Batch: %d questions, %d already done, %d to run with %d workers", len(questions),
+                 len(questions) - len(pending), len(pending), parallelism)
+
+    if os.path.dirname(output_path):
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    counts = {"ok": 0, "failed": 0}
+    started = time.perf_counter()
+
+    def run_question(question):
+        question_started = time.perf_counter()
+        result = {"id": question["id"], "query": question["query"]}
+        try:
+            result["response"] = process(question["query"])
+        except Exception as e:
+            logging.error(f"Batch question {question['id']} failed: {e}")
+            result["error"] = str(e)
+        result["elapsed_s"] = round(time.perf_counter() - question_started, 3)
+        return result
+
+    # Results are appended and flushed as they finish, so an interrupted run resumes where it stopped
+    with open(output_path, "a" if resume else "w") as output_file, \
+            concurrent.futures.ThreadPoolExecutor(max_workers=parallelism, thread_name_prefix="batch") as executor:
+        if resume and output_file.tell() > 0 and not ends_with_newline(output_path):
+            output_file.write("\n")  # Start after a line cut short by an interrupted run
+        futures = [executor.submit(run_question, question) for question in pending]
+        for future in concurrent.futures.as_completed(futures):
+            result = future.result()
+            output_file.write(json.dumps(result) + "\n")
+            output_file.flush()
+            counts["failed" if "error" in result else "ok"] += 1
+            done = counts["ok"] + counts["failed"]
+            if done % 10 == 0 or done == len(pending):
+                logging.info("Batch progress: %d/%d (%d failed)", done, len(pending), counts["failed"])
+
+    elapsed = time.perf_counter() - started
+    summary = {"total": len(questions), "skipped": len(questions) - len(pending), "succeeded": counts["ok"],
+               "failed": counts["failed"], "elapsed_s": round(elapsed, 2)}
+    logging.info("Batch finished: %s", summary)
+    return summary
@@ -0,0 +1,138 @@
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+def normalize_cql(cql):
+    # CQL text search is case-insensitive, so queries differing only in case or spacing share an entry
+    return " ".join(cql.split()).lower()
+
+
+class ConfluenceSearchCache:
+    # LRU cache of CQL search results plus parsed pages keyed by page id and version.
+    # Search entries expire after ttl seconds and are then revalidated against page versions.
+    # With persist_path set, changes are written at most every save_interval seconds by a background
+    # timer and once more at interpreter exit, never on the request path.
+
+    def __init__(self, max_entries=256, ttl=300, persist_path=None, max_pages=None, save_interval=5.0):
+        self.max_entries = max_entries
+        self.max_pages = max_pages or max_entries * 4
+        self.ttl = ttl
+        self.persist_path = persist_path
+        self.save_interval = save_interval
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self._searches = OrderedDict()
+        self._pages = OrderedDict()
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._save_timer = None
+        if persist_path:
+            self._load()
+            atexit.register(self.flush)
+
+    def get_search(self, cql):
+        # Returns (pages, is_fresh), or (None, False) on a miss
+        key = normalize_cql(cql)
+        with self._lock:
+            entry = self._searches.get(key)
+            if entry is None:
+                self.misses += 1
+                return None, False
+            self._searches.move_to_end(key)
+            is_fresh = time.time() - entry["stored_at"] < self.ttl
+            if is_fresh:
+                self.hits += 1
+            else:
+                self.revalidations += 1
+            return entry["pages"], is_fresh
+
+    def put_search(self, cql, pages):
+        key = normalize_cql(cql)
+        with self._lock:
+            self._searches[key] = {"stored_at": time.time(), "pages": pages}
+            self._searches.move_to_end(key)
+            while len(self._searches) > self.max_entries:
+                self._searches.popitem(last=False)
+            for page in pages:
+                self._put_page_locked(page)
+            self._schedule_save_locked()
+
+    def get_page(self, page_id, version):
+        key = f"{page_id}:{version}"
+        with self._lock:
+            page = self._pages.get(key)
+            if page is not None:
+                self._pages.move_to_end(key)
+            return page
+
+    def put_page(self, page):
+        with self._lock:
+            self._put_page_locked(page)
+
+    def _put_page_locked(self, page):
+        key = f"{page['id']}:{page['version']}"
+        self._pages[key] = page
+        self._pages.move_to_end(key)
+        while len(self._pages) > self.max_pages:
+            self._pages.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "revalidations": self.revalidations,
+                "searches": len(self._searches),
+                "pages": len(self._pages),
+            }
+
+    def _load(self):
+        try:
+            with open(self.persist_path, "r") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable Confluence cache file {self.persist_path}: {e}")
+            return
+        # Entries were written oldest first, so trimming from the front keeps the most recently used
+        self._searches.update(data.get("searches", {}))
+        while len(self._searches) > self.max_entries:
+            self._searches.popitem(last=False)
+        self._pages.update(data.get("pages", {}))
+        while len(self._pages) > self.max_pages:
+            self._pages.popitem(last=False)
+
+    def _schedule_save_locked(self):
+        if not self.persist_path:
+            return
+        self._dirty = True
+        if self._save_timer is None:
+            self._save_timer = threading.Timer(self.save_interval, self.flush)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def flush(self):
+        # Writes pending changes to persist_path; called by the save timer and at exit
+        with self._lock:
+            self._save_timer = None
+            if not self._dirty:
+                return
+            self._dirty = False
+            data = {"searches": dict(self._searches), "pages": dict(self._pages)}
+        directory = os.path.dirname(self.persist_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.persist_path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.persist_path)
+        except OSError as e:
+            logging.warning(f"Could not persist Confluence cache to {self.persist_path}: {e}")
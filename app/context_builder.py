@@ -0,0 +1,142 @@
+import math
+import re
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Prompt overhead per passage: the "Title: " prefix and separators
+PASSAGE_OVERHEAD_TOKENS = 4
+SENTENCE_BOUNDARY_PATTERN = re.compile(r"(?<=[.!?:;])\s+")
+SECTION_BOUNDARY_PATTERN = re.compile(r"\n\s*\n")
+TERM_WEIGHTS = {"error_code": 3.0, "errors": 3.0, "exception": 3.0, "service": 1.0, "services": 1.0,
+                "correlation_id": 2.0, "endpoints": 1.0}
+
+_encoding = None
+
+
+def count_tokens(text):
+    # Exact with tiktoken installed, otherwise the usual ~4 characters per token estimate
+    global _encoding
+    if tiktoken is not None:
+        if _encoding is None:
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        return len(_encoding.encode(text))
+    return math.ceil(len(text) / 4)
+
+
+def split_passages(text, passage_tokens=150):
+    # Blank-line separated sections first; long sections are cut at sentence boundaries
+    passages = []
+    for section in SECTION_BOUNDARY_PATTERN.split(text):
+        section = section.strip()
+        if not section:
+            continue
+        if count_tokens(section) <= passage_tokens:
+            passages.append(section)
+            continue
+        current = []
+        current_tokens = 0
+        for sentence in SENTENCE_BOUNDARY_PATTERN.split(section):
+            sentence_tokens = count_tokens(sentence)
+            if current and current_tokens + sentence_tokens > passage_tokens:
+                passages.append(" ".join(current))
+                current, current_tokens = [], 0
+            current.append(sentence)
+            current_tokens += sentence_tokens
+        if current:
+            passages.append(" ".join(current))
+    return passages
+
+
+def relevance_terms(*keyword_sources):
+    # Collects weighted terms from Splunk field dicts ({"service": ..., "error_code": ...}),
+    # extracted query keywords ({"services": [...], "errors": [...]}) or plain strings
+    terms = {}
+
+    def add(term, weight):
+        term = str(term).strip().lower()
+        if term:
+            terms[term] = max(terms.get(term, 0.0), weight)
+            if "_" in term:
+                terms[term.replace("_", " ")] = max(terms.get(term.replace("_", " "), 0.0), weight)
+
+    for source in keyword_sources:
+        for keyword in source or []:
+            if isinstance(keyword, dict):
+                for field, values in keyword.items():
+                    for value in values if isinstance(values, list) else [values]:
+                        if value:
+                            add(value, TERM_WEIGHTS.get(field, 1.0))
+            else:
+                add(keyword, TERM_WEIGHTS["errors"])
+    return terms
+
+
+def score_passage(passage, title, terms):
+    text = passage.lower()
+    score = sum(weight * text.count(term) for term, weight in terms.items())
+    # Passages of pages whose title names the error are likely on topic even without repeating it
+    return score + 0.5 * sum(weight for term, weight in terms.items() if term in title.lower())
+
+
+def assemble_context(page_lists, terms, max_tokens=1500, passage_tokens=150):
+    # Dedupes pages across keyword lookups, splits them into passages, ranks the passages by
+    # overlap with the error codes and services, and packs the best into max_tokens.
+    # Returns (snippets, urls, stats) with snippets in the "Title: text" form the prompt expects.
+    pages = []
+    seen_page_ids = set()
+    snippet_tokens = 0
+    for page_list in page_lists:
+        for page in page_list:
+            if page["id"] is not None and page["id"] in seen_page_ids:
+                continue
+            seen_page_ids.add(page["id"])
+            text = page.get("text") or page.get("snippet", "")
+            # What the same pages cost as the 1000-character snippets used before the budget
+            snippet_tokens += count_tokens(f"{page['title']}: {page.get('snippet', text[:1000])}")
+            pages.append((page, text))
+
+    candidates = []
+    passage_count = 0
+    for page_index, (page, text) in enumerate(pages):
+        for position, passage in enumerate(split_passages(text, passage_tokens)):
+            passage_count += 1
+            tokens = count_tokens(passage) + PASSAGE_OVERHEAD_TOKENS
+            score = score_passage(passage, page["title"], terms)
+            if terms and score == 0:
+                continue  # Mentions neither the error nor the service, and neither does its page title
+            # Earlier sections (overview, first steps) win ties
+            candidates.append((score + 1.0 / (position + 2), page_index, position, passage, tokens))
+    title_tokens = {page_index: count_tokens(page["title"]) for page_index, (page, _) in enumerate(pages)}
+
+    selected = []
+    used_tokens = 0
+    used_pages = set()
+    for candidate in sorted(candidates, key=lambda candidate: (-candidate[0], candidate[1], candidate[2])):
+        _, page_index, _, _, tokens = candidate
+        cost = tokens + (title_tokens[page_index] if page_index not in used_pages else 0)
+        if used_tokens + cost > max_tokens:
+            continue
+        selected.append(candidate)
+        used_tokens += cost
+        used_pages.add(page_index)
+
+    # Passages go back into page and reading order so steps stay in sequence
+    snippets = []
+    urls = []
+    for page_index, (page, _) in enumerate(pages):
+        page_passages = sorted((candidate[2], candidate[3]) for candidate in selected if candidate[1] == page_index)
+        if not page_passages:
+            continue
+        text = page_passages[0][1]
+        for (previous, _), (position, passage) in zip(page_passages, page_passages[1:]):
+            text += (" " if position == previous + 1 else " ... ") + passage
+        snippets.append(f"{page['title']}: {text}")
+        urls.append(f"{page['title']}: {page['url']}")
+
+    stats = {"pages": len(pages), "passages": passage_count, "selected": len(selected),
+             "snippet_tokens": snippet_tokens, "context_tokens": used_tokens,
+             "tokens_saved": snippet_tokens - used_tokens}
+    return snippets, urls, stats
@@ -0,0 +1,116 @@
+import re
+import threading
+
+ERROR_CODE_PATTERN = re.compile(r"\b[A-Z][A-Z0-9]*(?:_[A-Z0-9]+)+\b")
+EXCEPTION_PATTERN = re.compile(r"\b[A-Z]\w*(?:Exception|Error)\b")
+HTTP_ERROR_PATTERN = re.compile(r"\bHTTP[ _-]?[45]\d{2}\b", re.IGNORECASE)
+CORRELATION_ID_PATTERN = re.compile(r"\berr\d+\b", re.IGNORECASE)
+ENDPOINT_PATTERN = re.compile(r"(?<![\w.:/])/(?:[\w.-]+/)*[\w.-]+")
+# Service names outside the vocabulary still look like "checkout-service" or "CheckoutService"
+SERVICE_NAME_PATTERN = re.compile(r"\b(?:[A-Za-z][A-Za-z0-9]*(?:-[A-Za-z0-9]+)*-service|[A-Z][A-Za-z0-9]*Service)\b")
+CAMEL_CASE_BOUNDARY = re.compile(r"(?<=[a-z0-9])(?=[A-Z])")
+
+# Confidence contributed by each kind of match; a query scoring below the caller's
+# threshold is handed to the LLM instead
+MATCH_WEIGHTS = {
+    "known_service": 0.4,
+    "service_pattern": 0.3,
+    "known_error": 0.5,
+    "error_pattern": 0.3,
+    "correlation_id": 0.5,
+    "endpoint": 0.3,
+}
+
+
+def service_aliases(service):
+    # "MandateService" is also written "mandate service" or just "mandate"
+    spaced = CAMEL_CASE_BOUNDARY.sub(" ", service).lower()
+    aliases = {service.lower(), spaced}
+    if spaced.endswith(" service"):
+        aliases.add(spaced[:-len(" service")])
+    else:
+        aliases.add(f"{spaced} service")
+    return aliases
+
+
+class KeywordExtractor:
+    # Precompiled rule/dictionary extractor returning the same shape as the LLM prompt
+
+    def __init__(self, vocabulary):
+        self.known_errors = set(vocabulary.get("errors", []))
+        self.service_by_alias = {}
+        for service in vocabulary.get("services", []):
+            for alias in service_aliases(service):
+                self.service_by_alias[alias] = service
+        aliases = sorted(self.service_by_alias, key=len, reverse=True)
+        self.service_pattern = (re.compile(r"\b(?:" + "|".join(re.escape(a) for a in aliases) + r")\b",
+                                           re.IGNORECASE) if aliases else None)
+
+        self.fast_path_hits = 0
+        self.llm_fallbacks = 0
+        self.fast_path_seconds = 0.0
+        self.llm_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def extract(self, user_query):
+        keywords = {"services": [], "errors": [], "correlation_id": [], "endpoints": []}
+        confidence = 0.0
+
+        if self.service_pattern:
+            for match in self.service_pattern.finditer(user_query):
+                service = self.service_by_alias[match.group(0).lower()]
+                if service not in keywords["services"]:
+                    keywords["services"].append(service)
+                    confidence += MATCH_WEIGHTS["known_service"]
+
+        for name in SERVICE_NAME_PATTERN.findall(user_query):
+            # "mandate-service" is an alias of a known service; anything else is kept as written
+            if name.lower().replace("-", " ") in self.service_by_alias or name.lower() in self.service_by_alias:
+                continue
+            if name not in keywords["services"]:
+                keywords["services"].append(name)
+                confidence += MATCH_WEIGHTS["service_pattern"]
+
+        for pattern in (ERROR_CODE_PATTERN, EXCEPTION_PATTERN, HTTP_ERROR_PATTERN):
+            for error in pattern.findall(user_query):
+                if error not in keywords["errors"]:
+                    keywords["errors"].append(error)
+                    confidence += MATCH_WEIGHTS["known_error" if error in self.known_errors else "error_pattern"]
+
+        for correlation_id in CORRELATION_ID_PATTERN.findall(user_query):
+            if correlation_id.lower() not in keywords["correlation_id"]:
+                keywords["correlation_id"].append(correlation_id.lower())
+                confidence += MATCH_WEIGHTS["correlation_id"]
+
+        for endpoint in ENDPOINT_PATTERN.findall(user_query):
+            if endpoint not in keywords["endpoints"]:
+                keywords["endpoints"].append(endpoint)
+                confidence += MATCH_WEIGHTS["endpoint"]
+
+        return keywords, min(confidence, 1.0)
+
+    def record_fast_path(self, elapsed):
+        with self._lock:
+            self.fast_path_hits += 1
+            self.fast_path_seconds += elapsed
+
+    def record_llm_fallback(self, elapsed):
+        with self._lock:
+            self.llm_fallbacks += 1
+            self.llm_seconds += elapsed
+
+    def stats(self):
+        with self._lock:
+            total = self.fast_path_hits + self.llm_fallbacks
+            average_llm_seconds = self.llm_seconds / self.llm_fallbacks if self.llm_fallbacks else None
+            saved = None
+            if average_llm_seconds is not None:
+                saved = self.fast_path_hits * average_llm_seconds - self.fast_path_seconds
+            return {
+                "fast_path_hits": self.fast_path_hits,
+                "llm_fallbacks": self.llm_fallbacks,
+                "hit_rate": self.fast_path_hits / total if total else 0.0,
+                "average_llm_seconds": average_llm_seconds,
+                "estimated_seconds_saved": saved,
+            }
+
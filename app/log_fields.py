@@ -0,0 +1,70 @@
+import json
+import re
+
+# key=value or key="quoted value", matched in a single left-to-right pass
+LOG_FIELD_PATTERN = re.compile(r'(\w+)=("[^"]*"|\S+)')
+# The two fields the runbook lookup needs; found directly, even inside an HEC JSON body
+SERVICE_FIELD_PATTERN = re.compile(r'service=(\w+)')
+ERROR_CODE_FIELD_PATTERN = re.compile(r'error_code=(\w+)')
+
+
+class LogRecord:
+    __slots__ = ("level", "service", "host", "environment", "event", "error_code", "exception",
+                 "correlation_id", "file", "extra")
+
+    FIELDS = frozenset(__slots__) - {"extra"}
+
+    def __init__(self, fields):
+        # Known fields are popped into slots; whatever is left over goes to extra
+        pop = fields.pop
+        self.level = pop("level", None)
+        self.service = pop("service", None)
+        self.host = pop("host", None)
+        self.environment = pop("environment", None)
+        self.event = pop("event", None)
+        self.error_code = pop("error_code", None)
+        self.exception = pop("exception", None)
+        self.correlation_id = pop("correlation_id", None)
+        self.file = pop("file", None)
+        self.extra = fields or None
+
+    def get(self, field, default=None):
+        if field in self.FIELDS:
+            value = getattr(self, field)
+        else:
+            value = (self.extra or {}).get(field)
+        return default if value is None else value
+
+    def as_dict(self):
+        fields = {field: getattr(self, field) for field in self.__slots__[:-1] if getattr(self, field) is not None}
+        if self.extra:
+            fields.update(self.extra)
+        return fields
+
+    def __repr__(self):
+        return f"LogRecord({self.as_dict()!r})"
+
+
+def unwrap_hec_event(raw):
+    # Events sent through HEC keep the key=value line in the "error" field of a JSON body
+    if raw.startswith("{"):
+        try:
+            return json.loads(raw).get("error", raw)
+        except ValueError:
+            pass
+    return raw
+
+
+def parse_log_line(line):
+    # Every field of a line, for the local log backend (its index and trace lookups) and the trace timelines. Splunk search results
+    # only need extract_service_and_error_code.
+    return LogRecord({key: value[1:-1] if value[0] == '"' else value
+                      for key, value in LOG_FIELD_PATTERN.findall(unwrap_hec_event(line))})
+
+
+def extract_service_and_error_code(line):
+    # Two precompiled searches are several times faster than parse_log_line when nothing else is needed
+    service = SERVICE_FIELD_PATTERN.search(line)
+    error_code = ERROR_CODE_FIELD_PATTERN.search(line)
+    return {"service": service.group(1) if service else None,
+            "error_code": error_code.group(1) if error_code else None}
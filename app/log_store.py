@@ -0,0 +1,258 @@
+import glob
+import json
+import logging
+import mmap
+import os
+import re
+import threading
+import time
+from array import array
+from bisect import bisect_left
+
+from log_fields import parse_log_line
+
+SEGMENT_PATTERN = "segment-*.ndjson"
+# The index is kept next to the segments: typed arrays read through mmap, plus the segments it was built
+# from and the field lexicon ({field: {value: [start, count]}} into postings.bin)
+INDEX_DIR = "index"
+INDEX_META_FILE = "meta.json"
+INDEX_ARRAYS = {"times": "d", "segment_ids": "H", "offsets": "Q", "lengths": "I", "postings": "I"}
+INDEXED_FIELDS = ("level", "service", "error_code", "exception", "correlation_id")
+TIME_MODIFIER_PATTERN = re.compile(r"^-(\d+)([smhd])$")
+TIME_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def resolve_time_modifier(value, now=None):
+    # Understands the Splunk modifiers used in config.yaml: "now", "-15m", "-24h", "-7d" or epoch seconds
+    now = time.time() if now is None else now
+    if value in (None, ""):
+        return None
+    if value == "now":
+        return now
+    match = TIME_MODIFIER_PATTERN.match(str(value))
+    if match:
+        return now - int(match.group(1)) * TIME_UNITS[match.group(2)]
+    return float(value)
+
+
+class LocalLogStore:
+    # NDJSON segments in HEC event format (as written by scripts/generate_workload.py), read
+    # through mmap. The field index is built once, written next to the segments and mapped on later loads;
+    # it is rebuilt when the segments change. Event ids are assigned newest first, so every posting list in the
+    # field index is already in time order and "head N" stops after N matches.
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._segments = []
+        self._index_maps = []
+        self._load()
+
+    def _load(self):
+        started = time.perf_counter()
+        for path in sorted(glob.glob(os.path.join(self.directory, SEGMENT_PATTERN))):
+            self._segments.append(self._open_segment(path))
+        segment_sizes = [[os.path.basename(segment["path"]), segment["size"]] for segment in self._segments]
+        if self._map_index(segment_sizes):
+            source = "index"
+        else:
+            entries = []
+            for segment_id, segment in enumerate(self._segments):
+                entries.extend(self._scan_segment(segment_id, segment))
+            self._build_index(entries)
+            self._save_index(segment_sizes)
+            source = "segments"
+        logging.info("Loaded %d events from %d local log segments in %.2fs (from %s)", len(self.times),
+                     len(self._segments), time.perf_counter() - started, source)
+
+    @staticmethod
+    def _open_segment(path):
+        segment_file = open(path, "rb")
+        size = os.fstat(segment_file.fileno()).st_size
+        mapped = mmap.mmap(segment_file.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        return {"path": path, "file": segment_file, "mmap": mapped, "size": size}
+
+    @staticmethod
+    def _scan_segment(segment_id, segment, start=0):
+        mapped = segment["mmap"]
+        if mapped is None:
+            return
+        offset = start
+        while offset < segment["size"]:
+            end = mapped.find(b"\n", offset)
+            if end == -1:
+                end = segment["size"]
+            if end > offset:
+                event = json.loads(mapped[offset:end])
+                record = parse_log_line(event["event"].get("error", ""))
+                timestamp = event.get("time", event["event"].get("timestamp", 0))
+                yield timestamp, segment_id, offset, end - offset, record
+            offset = end + 1
+
+    def _build_index(self, entries):
+        entries.sort(key=lambda entry: entry[0], reverse=True)
+        self.times = array("d")
+        self.segment_ids = array("H")
+        self.offsets = array("Q")
+        self.lengths = array("I")
+        postings_by_value = {}
+        for event_id, (timestamp, segment_id, offset, length, record) in enumerate(entries):
+            self.times.append(timestamp)
+            self.segment_ids.append(segment_id)
+            self.offsets.append(offset)
+            self.lengths.append(length)
+            for field in INDEXED_FIELDS:
+                value = getattr(record, field)
+                if value is not None:
+                    postings_by_value.setdefault((field, value.lower()), array("I")).append(event_id)
+        # All posting lists back to back, as saved; lexicon[field][value] is [start, count] into them
+        postings = array("I")
+        self.lexicon = {}
+        for (field, value), ids in sorted(postings_by_value.items()):
+            self.lexicon.setdefault(field, {})[value] = [len(postings), len(ids)]
+            postings.extend(ids)
+        self.postings = memoryview(postings)
+
+    def _save_index(self, segment_sizes):
+        # Best effort: a read-only directory only means the next load scans the segments again
+        if not self._segments:
+            return
+        index_dir = os.path.join(self.directory, INDEX_DIR)
+        arrays = {"times": self.times, "segment_ids": self.segment_ids, "offsets": self.offsets,
+                  "lengths": self.lengths, "postings": self.postings.obj}
+        try:
+            os.makedirs(index_dir, exist_ok=True)
+            for name, values in arrays.items():
+                _replace_file(os.path.join(index_dir, f"{name}.bin"), "wb", values.tofile)
+            # Written last, so an index interrupted halfway never matches the segments
+            _replace_file(os.path.join(index_dir, INDEX_META_FILE), "w",
+                          lambda f: json.dump({"segments": segment_sizes, "lexicon": self.lexicon}, f))
+        except OSError as e:
+            logging.warning(f"Could not save the local log index to {index_dir}: {e}")
+
+    def _map_index(self, segment_sizes):
+        # Maps a saved index built from exactly these segments; False when there is none
+        index_dir = os.path.join(self.directory, INDEX_DIR)
+        try:
+            with open(os.path.join(index_dir, INDEX_META_FILE), "r") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if meta.get("segments") != segment_sizes:
+            return False
+        arrays = {}
+        for name, typecode in INDEX_ARRAYS.items():
+            try:
+                index_file = open(os.path.join(index_dir, f"{name}.bin"), "rb")
+            except OSError:
+                self._close_index()
+                return False
+            if os.fstat(index_file.fileno()).st_size:
+                mapped = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+                arrays[name] = memoryview(mapped).cast(typecode)
+            else:
+                mapped = None
+                arrays[name] = memoryview(array(typecode))
+            self._index_maps.append((arrays[name], mapped, index_file))
+        self.times = arrays["times"]
+        self.segment_ids = arrays["segment_ids"]
+        self.offsets = arrays["offsets"]
+        self.lengths = arrays["lengths"]
+        self.postings = arrays["postings"]
+        self.lexicon = meta["lexicon"]
+        return True
+
+    def _posting_list(self, field, value):
+        entry = self.lexicon.get(field, {}).get(str(value).lower())
+        return self.postings[entry[0]:entry[0] + entry[1]] if entry else ()
+
+    def read_event(self, event_id):
+        mapped = self._segments[self.segment_ids[event_id]]["mmap"]
+        offset = self.offsets[event_id]
+        return json.loads(mapped[offset:offset + self.lengths[event_id]])
+
+    def search(self, fields=None, text=None, earliest=None, latest=None, limit=1):
+        # fields: {field: [values]} ANDed across fields, ORed within one; text: case-insensitive substrings.
+        # Returns Splunk-shaped result rows, newest first.
+        earliest = resolve_time_modifier(earliest)
+        latest = resolve_time_modifier(latest)
+        text = [term.lower() for term in (text or [])]
+        # Terms are matched against _raw, not the whole JSON line. Those JSON leaves unescaped are first
+        # looked for in the line's bytes, which skips decoding lines that cannot match.
+        prefilters = [term.encode("utf-8") for term in text if json.dumps(term)[1:-1] == term]
+
+        with self._lock:
+            candidate_lists = []
+            for field, values in (fields or {}).items():
+                if field not in INDEXED_FIELDS:
+                    raise ValueError(f"Field '{field}' is not indexed by the local log store")
+                lists = [self._posting_list(field, value) for value in values]
+                candidate_lists.append(lists)
+
+            if candidate_lists:
+                # Drive the scan from the most selective field; check the others by binary search
+                candidate_lists.sort(key=lambda lists: sum(len(ids) for ids in lists))
+                driver = sorted(set().union(*candidate_lists[0])) if len(candidate_lists[0]) > 1 \
+                    else candidate_lists[0][0]
+                others = candidate_lists[1:]
+            else:
+                driver = range(len(self.times))
+                others = []
+
+            results = []
+            for event_id in driver:
+                timestamp = self.times[event_id]
+                if latest is not None and timestamp > latest:
+                    continue
+                if earliest is not None and timestamp < earliest:
+                    break  # ids are newest first, everything after is older
+                if not all(any(_contains(ids, event_id) for ids in lists) for lists in others):
+                    continue
+                if prefilters:
+                    mapped = self._segments[self.segment_ids[event_id]]["mmap"]
+                    offset = self.offsets[event_id]
+                    line = mapped[offset:offset + self.lengths[event_id]].lower()
+                    if not all(term in line for term in prefilters):
+                        continue
+                raw = self.read_event(event_id)["event"].get("error", "")
+                if text and not all(term in raw.lower() for term in text):
+                    continue
+                results.append({"_time": timestamp, "_raw": raw})
+                if len(results) >= limit:
+                    break
+            return results
+
+    def close(self):
+        with self._lock:
+            self.lexicon = {}
+            self.postings = self.times = self.segment_ids = self.offsets = self.lengths = memoryview(array("I"))
+            self._close_index()
+            for segment in self._segments:
+                self._close_segment(segment)
+            self._segments = []
+
+    def _close_index(self):
+        for view, mapped, index_file in self._index_maps:
+            view.release()
+            if mapped is not None:
+                mapped.close()
+            index_file.close()
+        self._index_maps = []
+
+    @staticmethod
+    def _close_segment(segment):
+        if segment["mmap"] is not None:
+            segment["mmap"].close()
+        segment["file"].close()
+
+
+def _replace_file(path, mode, write):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, mode) as f:
+        write(f)
+    os.replace(tmp_path, path)
+
+
+def _contains(sorted_ids, event_id):
+    position = bisect_left(sorted_ids, event_id)
+    return position < len(sorted_ids) and sorted_ids[position] == event_id
@@ -0,0 +1,110 @@
+import time
+
+from log_fields import parse_log_line
+
+# Levels that always survive compaction; INFO events fill whatever room is left
+NOTABLE_LEVELS = ("ERROR", "WARN", "WARNING", "FATAL")
+
+
+def split_trace_event(trace_event):
+    # Trace rows carry each event as "<epoch _time>|<_raw>" so the order and offsets survive stats list()
+    timestamp, _, raw = str(trace_event).partition("|")
+    try:
+        return float(timestamp), raw
+    except ValueError:
+        return None, str(trace_event)
+
+
+def build_timeline(row, max_events=25):
+    # Folds one trace row ({"correlation_id", "events": [...]}) into a compact, ordered timeline:
+    # repeated identical events collapse into one entry with a count, and when the chain is still
+    # longer than max_events the first and last events and every WARN/ERROR are kept first
+    events = row.get("events") or []
+    if isinstance(events, str):
+        events = [events]  # Splunk returns a single-valued list() as a plain string
+
+    parsed = []
+    for position, trace_event in enumerate(events):
+        timestamp, raw = split_trace_event(trace_event)
+        parsed.append((timestamp if timestamp is not None else 0.0, position, parse_log_line(raw)))
+    parsed.sort(key=lambda item: (item[0], item[1]))
+
+    entries = []
+    services, hosts, error_codes = [], [], []
+    start = parsed[0][0] if parsed else None
+    for timestamp, _, record in parsed:
+        for values, value in ((services, record.service), (hosts, record.host), (error_codes, record.error_code)):
+            if value and value not in values:
+                values.append(value)
+        key = (record.level, record.service, record.host, record.event, record.error_code)
+        if entries and entries[-1]["key"] == key:
+            entries[-1]["count"] += 1
+            entries[-1]["last_offset_s"] = round(timestamp - start, 3)
+            continue
+        entry = {"key": key, "offset_s": round(timestamp - start, 3), "level": record.level,
+                 "service": record.service, "host": record.host, "event": record.event, "count": 1}
+        if record.error_code:
+            entry["error_code"] = record.error_code
+        if record.exception:
+            entry["exception"] = record.exception
+        entries.append(entry)
+
+    omitted = 0
+    if len(entries) > max_events:
+        keep = {0, len(entries) - 1}
+        keep.update(index for index, entry in enumerate(entries) if entry["level"] in NOTABLE_LEVELS)
+        keep = set(sorted(keep, key=lambda index: (entries[index]["level"] != "ERROR", index))[:max_events])
+        for index in range(len(entries)):
+            if len(keep) >= max_events:
+                break
+            keep.add(index)
+        omitted = sum(entry["count"] for index, entry in enumerate(entries) if index not in keep)
+        entries = [entry for index, entry in enumerate(entries) if index in keep]
+
+    for entry in entries:
+        del entry["key"]
+        if entry["count"] == 1:
+            del entry["count"]
+    end = parsed[-1][0] if parsed else None
+    return {
+        "correlation_id": row.get("correlation_id"),
+        "start": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(start)) if start else None,
+        "duration_s": round(end - start, 3) if parsed else 0.0,
+        "event_count": int(row.get("event_count") or len(parsed)),
+        "services": services,
+        "hosts": hosts,
+        "error_codes": error_codes,
+        "events": entries,
+        "omitted_events": omitted,
+    }
+
+
+def timeline_error_fields(timelines):
+    # The {"service", "error_code"} pairs of the ERROR events, in the shape the runbook lookup expects
+    fields = []
+    for timeline in timelines:
+        for entry in timeline["events"]:
+            if entry["level"] != "ERROR":
+                continue
+            pair = {"service": entry.get("service"), "error_code": entry.get("error_code")}
+            if pair not in fields:
+                fields.append(pair)
+    return fields
+
+
+def format_timeline(timeline):
+    # One line per event, offsets relative to the first event of the chain
+    lines = [f"correlation_id={timeline['correlation_id']} started {timeline['start']}, "
+             f"{timeline['event_count']} events over {timeline['duration_s']}s across "
+             f"{', '.join(timeline['hosts']) or 'unknown hosts'}"]
+    for entry in timeline["events"]:
+        line = f"+{entry['offset_s']:.3f}s {entry['level']} {entry['service']}@{entry['host']}"
+        if entry.get("error_code"):
+            line += f" [{entry['error_code']}]"
+        line += f" {entry['event']}"
+        if entry.get("count"):
+            line += f" (x{entry['count']} until +{entry['last_offset_s']:.3f}s)"
+        lines.append(line)
+    if timeline["omitted_events"]:
+        lines.append(f"... {timeline['omitted_events']} more events omitted")
+    return "\n".join(lines)
@@ -1,18 +1,40 @@
+import argparse
+import concurrent.futures
+import contextvars
+import functools
 import json
 import logging
 import os
 import re
 import sys
+import threading
 import time
+import uuid
 
 import requests
 import urllib3
 import yaml
 from dotenv import load_dotenv
-from openai import OpenAI
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'scripts'))
 from splunk_utils import SPLUNK_USERNAME, SPLUNK_PASSWORD
+from http_pool import RateLimiter, get_session, load_pool_settings, pool_stats
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from confluence_cache import ConfluenceSearchCache
+from runbook_index import RunbookIndex, index_query_text, sync_runbook_index
+from keyword_extractor import KeywordExtractor
+from response_cache import LookupMemo, RequestCoalescer, ResponseCache, normalize_keywords
+from log_fields import extract_service_and_error_code, parse_log_line
+from log_store import LocalLogStore, resolve_time_modifier
+from log_timeline import build_timeline, format_timeline, timeline_error_fields
+from context_builder import assemble_context, relevance_terms
+from storage_format import parse_named_sections, parse_storage_format, render_sections
+from batch_runner import load_batch_questions, run_batch
+from resilience import CircuitBreaker, CircuitOpen, hedged_call, is_degraded, mark_degraded, track_degraded
+from tracing import (configure_tracing, degraded_answers, keyword_extraction_seconds, keyword_extractions,
+                     record_payload, record_token_usage, set_attribute, set_trace_attribute, span,
+                     start_metrics_server, trace)
 
 # Disable SSL warnings
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
@@ -24,139 +46,869 @@ logging.getLogger("urllib3").setLevel(logging.WARNING)
 logging.getLogger("requests").setLevel(logging.WARNING)
 logging.getLogger("openai").setLevel(logging.WARNING)
 
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'config', 'config.yaml')
+
+
+@functools.lru_cache(maxsize=None)
+def load_config(path=CONFIG_PATH):
+    # Resolved next to this file, so the app no longer depends on being started from the repo root
+    with open(path, "r") as f:
+        return yaml.safe_load(f)
+
+
 # Load configuration
-with open("config/config.yaml", "r") as f:
-    config = yaml.safe_load(f)
+config = load_config()
 
 # Read values from config.yaml
 CONFLUENCE_BASE_URL = config.get("confluence_url", "https://default-confluence-url.com")
 CONFLUENCE_EMAIL = config.get("confluence_email", "default-email@example.com")
 SPLUNK_URL = config.get("splunk_url", "https://localhost:8089/services/search/jobs")
 SPLUNK_DOMAIN = config.get("splunk_domain", "https://localhost:8000")
+SPLUNK_EXEC_MODE = config.get("splunk_exec_mode", "normal")
+SPLUNK_JOB_TIMEOUT = config.get("splunk_job_timeout", 30)
+SPLUNK_POLL_INITIAL_INTERVAL = config.get("splunk_poll_initial_interval", 0.02)
+SPLUNK_POLL_MAX_INTERVAL = config.get("splunk_poll_max_interval", 1.0)
+SPLUNK_RESULTS_COUNT = 50
+SPLUNK_RESULTS_PAGE_SIZE = config.get("splunk_results_page_size", 100)
+SPLUNK_STREAM_RESULTS = config.get("splunk_stream_results", False)
+SPLUNK_INDEX = config.get("splunk_index", "main")
+SPLUNK_EARLIEST = config.get("splunk_earliest", "-24h")
+SPLUNK_LATEST = config.get("splunk_latest", "now")
+SPLUNK_RESULT_LIMIT = config.get("splunk_result_limit", 1)
+SPLUNK_LOG_JOB_STATS = config.get("splunk_log_job_stats", True)
+SPLUNK_RESULT_FIELDS = ["_time", "_raw", "service", "error_code", "correlation_id"]
+LOG_BACKEND = config.get("log_backend", "splunk")
+LOCAL_LOG_STORE_CONFIG = config.get("local_log_store", {})
+SPL_ERROR_CODE_PATTERN = re.compile(r"^[A-Z][A-Z0-9]*(?:_[A-Z0-9]+)+$")
+SPL_EXCEPTION_PATTERN = re.compile(r"^\w+Exception$")
+CONFLUENCE_MAX_CONCURRENCY = config.get("confluence_max_concurrency", 5)
+CONFLUENCE_SEARCH_TIMEOUT = config.get("confluence_search_timeout", 10)
+CONFLUENCE_CACHE_CONFIG = config.get("confluence_cache", {})
+RUNBOOK_INDEX_CONFIG = config.get("runbook_index", {})
+RUNBOOK_INDEX_TOP_K = RUNBOOK_INDEX_CONFIG.get("top_k", 3)
+KEYWORD_FAST_PATH_MIN_CONFIDENCE = config.get("keyword_fast_path_min_confidence", 0.3)
+KEYWORD_VOCABULARY = config.get("keyword_vocabulary", {})
+RESPONSE_CACHE_MAX_TTL = config.get("response_cache_ttl", 300)
+RESPONSE_CACHE_TTL_PER_WINDOW_HOUR = config.get("response_cache_ttl_per_window_hour", 2.5)
+RESPONSE_CACHE_MAX_ENTRIES = config.get("response_cache_max_entries", 512)
+CONFLUENCE_PREFETCH = config.get("confluence_prefetch", False)
+PIPELINE_STAGE_TIMEOUTS = config.get("pipeline_stage_timeouts", {})
+TRACING_CONFIG = config.get("tracing", {})
+BATCH_CONFIG = config.get("batch", {})
+CONTEXT_BUDGET_CONFIG = config.get("context_budget", {})
+CONFLUENCE_SECTIONS = config.get("confluence_sections", ["Resolution", "Steps"])
+SPLUNK_TRACE_CONFIG = config.get("splunk_trace", {})
+SEMANTIC_CACHE_CONFIG = config.get("semantic_cache", {})
+RESILIENCE_CONFIG = config.get("resilience", {})
+CONFLUENCE_HEDGING_CONFIG = RESILIENCE_CONFIG.get("confluence_hedging", {})
+DEGRADED_ANSWER_NOTE = RESILIENCE_CONFIG.get(
+    "degraded_answer_note", "\n\nNote: {backends} could not be reached, so this answer relies on cached or "
+                            "locally indexed runbooks and may be incomplete.")
+BACKEND_NAMES = {"splunk": "Splunk", "confluence": "Confluence"}
+
+
+def splunk_window_ttl():
+    # How long an answer stays valid: a window ending now picks up new events, so its answers last
+    # RESPONSE_CACHE_TTL_PER_WINDOW_HOUR seconds per hour it covers; a window with a fixed end never changes
+    if SPLUNK_LATEST != "now" and not str(SPLUNK_LATEST).startswith("-"):
+        return RESPONSE_CACHE_MAX_TTL
+    earliest = resolve_time_modifier(SPLUNK_EARLIEST, now=0.0)
+    if earliest is None:
+        return RESPONSE_CACHE_MAX_TTL  # All time: the window is as long as the logs go back
+    window_hours = (resolve_time_modifier(SPLUNK_LATEST, now=0.0) - earliest) / 3600
+    return min(RESPONSE_CACHE_MAX_TTL, window_hours * RESPONSE_CACHE_TTL_PER_WINDOW_HOUR)
+
+
+RESPONSE_CACHE_TTL = splunk_window_ttl()
+
+@functools.lru_cache(maxsize=None)
+def get_secret(name):
+    # .env is read and the secret checked on first use rather than at import
+    load_dotenv()
+    value = os.getenv(name)
+    if not value:
+        raise ValueError(f"{name} is not set in the environment variables.")
+    return value
+
+
+@functools.lru_cache(maxsize=None)
+def get_openai_client():
+    # Importing openai alone takes over half a second, so it waits until the first LLM call
+    from openai import OpenAI
+    openai_pool_settings = load_pool_settings("openai")
+    return OpenAI(api_key=get_secret("OPENAI_API_KEY"), timeout=openai_pool_settings["timeout"],
+                  max_retries=openai_pool_settings["max_retries"])
+
+
+@functools.lru_cache(maxsize=None)
+def get_semantic_cache():
+    # numpy would double the cold import time, so the cache is built on the first question. Its entries
+    # expire with the answer cache's, so a reworded question never gets an answer the exact match would not.
+    if not SEMANTIC_CACHE_CONFIG.get("enabled", True):
+        return None
+    from semantic_cache import SemanticCache
+    return SemanticCache(threshold=SEMANTIC_CACHE_CONFIG.get("threshold", 0.75),
+                         ttl=RESPONSE_CACHE_TTL,
+                         max_entries=SEMANTIC_CACHE_CONFIG.get("max_entries", 2048),
+                         dimensions=SEMANTIC_CACHE_CONFIG.get("dimensions", 2048),
+                         max_memory_mb=SEMANTIC_CACHE_CONFIG.get("max_memory_mb", 32),
+                         keyword_extractor=keyword_extractor)
+
+
+confluence_executor = concurrent.futures.ThreadPoolExecutor(max_workers=CONFLUENCE_MAX_CONCURRENCY,
+                                                            thread_name_prefix="confluence")
+
+# Duplicate (hedged) Confluence searches get their own threads so they never wait behind the searches they hedge
+hedge_executor = concurrent.futures.ThreadPoolExecutor(max_workers=CONFLUENCE_MAX_CONCURRENCY * 2,
+                                                       thread_name_prefix="confluence-hedge")
+# With confluence_prefetch, runbooks for the question's own terms are looked up while the Splunk job runs;
+# those lookups wait on confluence_executor, so they run on threads of their own
+prefetch_executor = concurrent.futures.ThreadPoolExecutor(max_workers=CONFLUENCE_MAX_CONCURRENCY,
+                                                          thread_name_prefix="confluence-prefetch")
+circuit_breakers = {name: CircuitBreaker(name, **settings)
+                    for name, settings in RESILIENCE_CONFIG.get("circuit_breakers", {}).items()}
+
+confluence_cache = None
+if CONFLUENCE_CACHE_CONFIG.get("enabled", True):
+    confluence_cache = ConfluenceSearchCache(
+        max_entries=CONFLUENCE_CACHE_CONFIG.get("max_entries", 256),
+        ttl=CONFLUENCE_CACHE_CONFIG.get("ttl", 300),
+        persist_path=CONFLUENCE_CACHE_CONFIG.get("persist_path"),
+        save_interval=CONFLUENCE_CACHE_CONFIG.get("save_interval", 5),
+    )
+
+runbook_index = None
+if RUNBOOK_INDEX_CONFIG.get("enabled", False):
+    runbook_index = RunbookIndex.load(RUNBOOK_INDEX_CONFIG.get("path", ".cache/runbook_index"))
+    if runbook_index is None:
+        logging.warning("Runbook index is enabled but has not been built; falling back to Confluence search")
+
+keyword_extractor = KeywordExtractor(KEYWORD_VOCABULARY)
+
+response_cache = ResponseCache(ttl=RESPONSE_CACHE_TTL, max_entries=RESPONSE_CACHE_MAX_ENTRIES)
+query_coalescer = RequestCoalescer()
+
+# Set for the duration of a batch run (see run_batch_queries)
+batch_lookups = None
+openai_rate_limiter = None
+
+configure_tracing(TRACING_CONFIG)
+
+NO_KEYWORDS_RESPONSE = ("I am sorry but I cannot respond to this query. I can help you find out a solution"
+                        " for your error if you provide me with either the service name, error type, correlation_id"
+                        " or endpoint.")
+ANSWER_TIMEOUT_RESPONSE = ("I found the relevant logs and runbooks, but writing the answer took longer than {timeout}s."
+                           " Please ask again in a moment.")
+
+
+class AnswerTimeout(Exception):
+    pass
+
+
+def start_metrics_endpoint():
+    # Called by the CLI and Streamlit entry points; the API server serves the same metrics on its own /metrics
+    if TRACING_CONFIG.get("metrics_port"):
+        return start_metrics_server(TRACING_CONFIG["metrics_port"])
+    return None
 
-# Set up environment variables
-load_dotenv()
 
-# Access the OpenAI API key and Confluence token
-api_key = os.getenv("OPENAI_API_KEY")
-confluence_token = os.getenv("CONFLUENCE_API_TOKEN")
+def call_backend(backend, func, *args):
+    # Goes through the backend's circuit breaker when one is configured; raises CircuitOpen while it is open
+    breaker = circuit_breakers.get(backend)
+    return breaker.call(func, *args) if breaker else func(*args)
 
-if not api_key:
-    raise ValueError("OPENAI_API_KEY is not set in the environment variables.")
 
-if not confluence_token:
-    raise ValueError("CONFLUENCE_API_TOKEN is not set in the environment variables.")
+def batch_lookup(key, func):
+    # During a batch run questions share Splunk and Confluence lookups. A lookup that had to do without a
+    # backend is not kept for later questions, and every question sharing it is marked degraded as well.
+    if batch_lookups is None:
+        return func()
 
-client = OpenAI(api_key=api_key)
+    def run_tracked():
+        with track_degraded() as degraded:
+            result = func()
+        return result, frozenset(degraded)
+
+    result, degraded = batch_lookups.get_or_run(key, run_tracked, remember=lambda outcome: not outcome[1])
+    for backend in degraded:
+        mark_degraded(backend)
+    return result
+
+
+def call_streaming_backend(backend, func, *args):
+    # call_backend for a func returning (lazy results, sid): the breaker sees the outcome of reading the results
+    breaker = circuit_breakers.get(backend)
+    return breaker.call_streaming(func, *args) if breaker else func(*args)
 
 
 def setup_splunk_session():
-    session = requests.Session()
-    session.auth = (SPLUNK_USERNAME, SPLUNK_PASSWORD)
-    session.verify = False
-    return session
+    return get_session("splunk", auth=(SPLUNK_USERNAME, SPLUNK_PASSWORD), verify=False)
+
+
+def setup_confluence_session():
+    return get_session("confluence", auth=(CONFLUENCE_EMAIL, get_secret("CONFLUENCE_API_TOKEN")))
+
+
+def wait_for_splunk_job(session, search_url, sid, timeout=None):
+    # Poll with exponential backoff so fast searches return in tens of ms, and give up
+    # (cancelling the job) once the deadline passes instead of hanging forever.
+    timeout = SPLUNK_JOB_TIMEOUT if timeout is None else timeout
+    deadline = time.monotonic() + timeout
+    interval = SPLUNK_POLL_INITIAL_INTERVAL
+    status_url = f"{search_url}/{sid}"
+    with span("splunk.job_wait", sid=sid) as job_wait:
+        while True:
+            status_response = session.get(status_url, params={"output_mode": "json"})
+            status_response.raise_for_status()
+            job_wait.add("polls", 1)
+            status = status_response.json()["entry"][0]["content"]
+            if status.get("isDone", False):
+                job_wait.set("run_duration", status.get("runDuration"))
+                return status
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                cancel_splunk_job(session, search_url, sid)
+                raise requests.exceptions.Timeout(f"Splunk job {sid} did not finish within {timeout}s")
+            time.sleep(min(interval, remaining))
+            interval = min(interval * 2, SPLUNK_POLL_MAX_INTERVAL)
+
 
+def log_splunk_job_stats(sid, status):
+    if SPLUNK_LOG_JOB_STATS:
+        logging.info('Splunk job %s: runDuration=%ss scanCount=%s eventCount=%s resultCount=%s', sid,
+                     status.get("runDuration"), status.get("scanCount"), status.get("eventCount"),
+                     status.get("resultCount"))
 
-def wait_for_splunk_job(session, search_url, sid):
+
+def cancel_splunk_job(session, search_url, sid):
+    try:
+        session.post(f"{search_url}/{sid}/control", data={"action": "cancel", "output_mode": "json"})
+        logging.warning("Cancelled Splunk job %s", sid)
+    except requests.exceptions.RequestException as e:
+        logging.error(f"Error cancelling Splunk job {sid}: {e}")
+
+
+def iter_splunk_job_results(session, search_url, sid, page_size=None):
+    # Page through /results with offset so memory stays bounded for large result sets.
+    page_size = page_size or SPLUNK_RESULTS_PAGE_SIZE
+    results_url = f"{search_url}/{sid}/results"
+    offset = 0
     while True:
-        status_url = f"{search_url}/{sid}"
-        status_response = session.get(status_url, params={"output_mode": "json"})
-        status = status_response.json()["entry"][0]["content"]
-        if status.get("isDone", False):
-            break
-        time.sleep(1)
+        results_response = session.get(results_url,
+                                       params={"output_mode": "json", "count": page_size, "offset": offset})
+        results_response.raise_for_status()
+        page = results_response.json().get("results", [])
+        yield from page
+        if len(page) < page_size:
+            return
+        offset += len(page)
+
+
+def run_splunk_job_normal(session, search_url, search_query):
+    search_params = {"search": search_query, "output_mode": "json", "exec_mode": "normal"}
+    job_response = session.post(search_url, data=search_params)
+    job_response.raise_for_status()
+    sid = job_response.json()["sid"]
+
+    status = wait_for_splunk_job(session, search_url, sid)
+    log_splunk_job_stats(sid, status)
+    return iter_splunk_job_results(session, search_url, sid), sid
+
+
+def run_splunk_job_blocking(session, search_url, search_query):
+    # Splunk only answers the job creation request once the search has finished. The sid is chosen
+    # here so a job still running when the request times out can be cancelled; max_time caps the
+    # search on the server as well.
+    sid = f"observability_monkey_{uuid.uuid4().hex}"
+    search_params = {"search": search_query, "output_mode": "json", "exec_mode": "blocking", "id": sid,
+                     "max_time": SPLUNK_JOB_TIMEOUT}
+    try:
+        job_response = session.post(search_url, data=search_params, timeout=SPLUNK_JOB_TIMEOUT)
+    except requests.exceptions.Timeout:
+        cancel_splunk_job(session, search_url, sid)
+        raise
+    job_response.raise_for_status()
+    sid = job_response.json().get("sid", sid)
+    if SPLUNK_LOG_JOB_STATS:
+        status_response = session.get(f"{search_url}/{sid}", params={"output_mode": "json"})
+        status_response.raise_for_status()
+        log_splunk_job_stats(sid, status_response.json()["entry"][0]["content"])
+    return iter_splunk_job_results(session, search_url, sid), sid
+
+
+def run_splunk_job_oneshot(session, search_url, search_query):
+    # Results come back inline; no job is kept around, so there is no sid to link to.
+    search_params = {"search": search_query, "output_mode": "json", "exec_mode": "oneshot",
+                     "count": SPLUNK_RESULTS_COUNT}
+    job_response = session.post(search_url, data=search_params, timeout=SPLUNK_JOB_TIMEOUT)
+    job_response.raise_for_status()
+    return job_response.json().get("results", []), None
+
+
+def run_splunk_job_export(session, search_url, search_query):
+    # The export endpoint streams results while the search is still running. The request is
+    # only sent once the caller starts iterating, and like oneshot there is no sid.
+    return stream_splunk_export(session, f"{search_url}/export", search_query), None
+
+
+def stream_splunk_export(session, export_url, search_query):
+    search_params = {"search": search_query, "output_mode": "json"}
+    with session.post(export_url, data=search_params, stream=True) as export_response:
+        export_response.raise_for_status()
+        for line in export_response.iter_lines():
+            if not line:
+                continue
+            row = json.loads(line)
+            if row.get("preview", False) or "result" not in row:
+                continue
+            yield row["result"]
+
+
+SPLUNK_JOB_STRATEGIES = {
+    "normal": run_splunk_job_normal,
+    "blocking": run_splunk_job_blocking,
+    "oneshot": run_splunk_job_oneshot,
+    "export": run_splunk_job_export,
+}
+
+splunk_job_metrics = {}
+_splunk_job_metrics_lock = threading.Lock()
+
 
+def record_splunk_job_timing(exec_mode, elapsed):
+    with _splunk_job_metrics_lock:
+        metrics = splunk_job_metrics.setdefault(
+            exec_mode, {"count": 0, "total_seconds": 0.0, "min_seconds": None, "max_seconds": 0.0})
+        metrics["count"] += 1
+        metrics["total_seconds"] += elapsed
+        metrics["min_seconds"] = elapsed if metrics["min_seconds"] is None else min(metrics["min_seconds"], elapsed)
+        metrics["max_seconds"] = max(metrics["max_seconds"], elapsed)
+        average = metrics["total_seconds"] / metrics["count"]
+    logging.info('Splunk %s job returned its first result after %.3fs (avg %.3fs over %d queries)', exec_mode, elapsed, average,
+                 metrics["count"])
 
-def extract_matching_logs_from_splunk(queryKeywords):
+
+def iter_unique_log_fields(results, exec_mode, started):
+    # Extract and dedupe fields as results arrive so consumers can start on the first event.
+    seen = set()
+    timed = False
+    with span("splunk.results", exec_mode=exec_mode, results=0) as fetch:
+        try:
+            for result in results:
+                if not timed:
+                    record_splunk_job_timing(exec_mode, time.perf_counter() - started)
+                    timed = True
+                fetch.add("results", 1)
+                if "_raw" not in result:
+                    continue
+                record_payload("splunk", len(result["_raw"]))
+                fields = extract_service_and_error_code(result["_raw"])
+                key = tuple(sorted(fields.items()))
+                if key in seen:
+                    continue
+                seen.add(key)
+                yield fields
+        except requests.exceptions.RequestException as e:
+            logging.error(f"Error streaming Splunk results: {e}")
+            mark_degraded("splunk")
+        finally:
+            if not timed:
+                record_splunk_job_timing(exec_mode, time.perf_counter() - started)
+
+
+def quote_spl_value(value):
+    return '"' + str(value).replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def normalize_service_name(service):
+    # The LLM tends to answer "Parser Service" where the logs say service=parser
+    words = str(service).split()
+    if len(words) > 1 and words[-1].lower() == "service":
+        words = words[:-1]
+    return "".join(words)
+
+
+def spl_any(field, values):
+    terms = [f"{field}={quote_spl_value(value)}" if field else quote_spl_value(value) for value in values]
+    return terms[0] if len(terms) == 1 else f'({" OR ".join(terms)})'
+
+
+def build_log_filters(queryKeywords):
+    # Splits extracted keywords into indexed field filters (ORed within a field) and free-text terms
+    error_codes, exceptions, free_text = [], [], []
+    for error in queryKeywords.get("errors", []):
+        if SPL_ERROR_CODE_PATTERN.match(error):
+            error_codes.append(error)
+        elif SPL_EXCEPTION_PATTERN.match(error):
+            exceptions.append(error)
+        else:
+            free_text.append(error)
+
+    services = [normalize_service_name(service) for service in queryKeywords.get("services", [])]
+    fields = {"level": ["ERROR"]}
+    for field, values in (("service", services),
+                          ("error_code", error_codes),
+                          ("exception", exceptions),
+                          ("correlation_id", queryKeywords.get("correlation_id", []))):
+        if values:
+            fields[field] = values
+    return fields, free_text + queryKeywords.get("endpoints", [])
+
+
+def build_base_search_terms(earliest=None, latest=None):
+    earliest = SPLUNK_EARLIEST if earliest is None else earliest
+    latest = SPLUNK_LATEST if latest is None else latest
+    terms = [f'index={SPLUNK_INDEX}', 'sourcetype="splunk_logs"']
+    if earliest:
+        terms.append(f"earliest={earliest}")
+    if latest:
+        terms.append(f"latest={latest}")
+    return terms
+
+
+def build_error_search_terms(queryKeywords, earliest=None, latest=None):
+    fields, free_text = build_log_filters(queryKeywords)
+    terms = build_base_search_terms(earliest, latest)
+    for field, values in fields.items():
+        terms.append("level=ERROR" if field == "level" else spl_any(field, values))
+    for value in free_text:
+        terms.append(quote_spl_value(value))
+    return terms
+
+
+def build_splunk_query(queryKeywords, earliest=None, latest=None, limit=None):
+    # Field-level terms and a bounded time range let Splunk skip most buckets, and head/fields run
+    # before anything else so only the newest matching events are shipped back
+    limit = limit or SPLUNK_RESULT_LIMIT
+    terms = build_error_search_terms(queryKeywords, earliest, latest)
+    return f'search {" ".join(terms)} | head {limit} | fields {" ".join(SPLUNK_RESULT_FIELDS)}'
+
+
+def build_splunk_trace_query(queryKeywords, earliest=None, latest=None, limit=None):
+    # One job for the whole chain: the subsearch picks the correlation ids of the newest matching
+    # errors, the outer search pulls every event of those ids and stats folds each id into one row.
+    # Events are listed as "<_time>|<_raw>" in time order; list() keeps at most 100 per id.
+    limit = limit or SPLUNK_TRACE_CONFIG.get("max_traces", 1)
+    error_terms = build_error_search_terms(queryKeywords, earliest, latest)
+    if not (queryKeywords.get("correlation_id") or []):
+        error_terms.append("correlation_id=*")
+    subsearch = f'search {" ".join(error_terms)} | head {limit} | fields correlation_id'
+    return (f'search {" ".join(build_base_search_terms(earliest, latest))} [{subsearch}]'
+            ' | sort 0 _time | eval trace_event=_time."|"._raw'
+            ' | stats count as event_count list(trace_event) as events by correlation_id')
+
+
+def search_splunk_logs(queryKeywords, exec_mode):
+    if exec_mode not in SPLUNK_JOB_STRATEGIES:
+        raise ValueError(f"Unknown Splunk exec_mode '{exec_mode}', expected one of {sorted(SPLUNK_JOB_STRATEGIES)}")
+    run_splunk_job = SPLUNK_JOB_STRATEGIES[exec_mode]
+
+    search_query = build_splunk_query(queryKeywords)
+    logging.info('Splunk Search Query: %s', search_query)
+    set_attribute("query_bytes", len(search_query))
+    return run_splunk_job(setup_splunk_session(), SPLUNK_URL, search_query)
+
+
+_local_log_store = None
+_local_log_store_lock = threading.Lock()
+
+
+def get_local_log_store():
+    global _local_log_store
+    with _local_log_store_lock:
+        if _local_log_store is None:
+            _local_log_store = LocalLogStore(LOCAL_LOG_STORE_CONFIG.get("path", "data/workload"))
+        return _local_log_store
+
+
+def prepare_log_backend():
+    # Called by every entry point at startup, so the local store's index is mapped (or rebuilt after the
+    # segments changed) before the first question rather than inside its search
+    if LOG_BACKEND == "local":
+        get_local_log_store()
+
+
+def search_local_logs(queryKeywords, exec_mode):
+    # Same filters and time window as the generated SPL, answered from local NDJSON segments
+    fields, free_text = build_log_filters(queryKeywords)
+    results = get_local_log_store().search(fields=fields, text=free_text, earliest=SPLUNK_EARLIEST,
+                                           latest=SPLUNK_LATEST, limit=SPLUNK_RESULT_LIMIT)
+    return results, None
+
+
+LOG_BACKENDS = {
+    "splunk": search_splunk_logs,
+    "local": search_local_logs,
+}
+
+
+def search_splunk_traces(queryKeywords, exec_mode):
+    if exec_mode not in SPLUNK_JOB_STRATEGIES:
+        raise ValueError(f"Unknown Splunk exec_mode '{exec_mode}', expected one of {sorted(SPLUNK_JOB_STRATEGIES)}")
+    search_query = build_splunk_trace_query(queryKeywords)
+    logging.info('Splunk Trace Query: %s', search_query)
+    set_attribute("query_bytes", len(search_query))
+    return SPLUNK_JOB_STRATEGIES[exec_mode](setup_splunk_session(), SPLUNK_URL, search_query)
+
+
+def search_local_traces(queryKeywords, exec_mode):
+    # Rows shaped like the trace query's stats output, built from the correlation_id index
+    store = get_local_log_store()
+    fields, free_text = build_log_filters(queryKeywords)
+    errors = store.search(fields=fields, text=free_text,
+                          earliest=SPLUNK_EARLIEST, latest=SPLUNK_LATEST,
+                          limit=SPLUNK_TRACE_CONFIG.get("max_traces", 1))
+    rows = []
+    for correlation_id in dict.fromkeys(parse_log_line(error["_raw"]).correlation_id for error in errors):
+        if correlation_id is None:
+            continue
+        events = store.search(fields={"correlation_id": [correlation_id]}, earliest=SPLUNK_EARLIEST,
+                              latest=SPLUNK_LATEST, limit=100)
+        rows.append({"correlation_id": correlation_id, "event_count": len(events),
+                     "events": [f"{event['_time']}|{event['_raw']}" for event in reversed(events)]})
+    return rows, None
+
+
+TRACE_BACKENDS = {
+    "splunk": search_splunk_traces,
+    "local": search_local_traces,
+}
+
+
+def stream_matching_logs_from_splunk(queryKeywords, exec_mode=None):
+    # Starts the log search and returns a lazy iterator of extracted fields plus the Splunk job sid
     if isinstance(queryKeywords, str):
         queryKeywords = json.loads(queryKeywords)
 
-    search_terms = (
-            queryKeywords.get("services", [])
-            + queryKeywords.get("errors", [])
-            + queryKeywords.get("correlation_id", [])
-            + queryKeywords.get("endpoints", [])
-    )
-
-    session = setup_splunk_session()
-    search_url = SPLUNK_URL
-    matching_logs = []
+    if LOG_BACKEND not in LOG_BACKENDS:
+        raise ValueError(f"Unknown log_backend '{LOG_BACKEND}', expected one of {sorted(LOG_BACKENDS)}")
+    exec_mode = LOG_BACKEND if LOG_BACKEND != "splunk" else (exec_mode or SPLUNK_EXEC_MODE)
 
     try:
-        search_query = f'search sourcetype="splunk_logs" ({" AND ".join(search_terms)}) level=ERROR | sort -_time | head 1'
-        logging.info('Splunk Search Query: %s', search_query)
-        search_params = {"search": search_query, "output_mode": "json", "exec_mode": "normal"}
-        job_response = session.post(search_url, data=search_params)
-        job_response.raise_for_status()
-        sid = job_response.json()["sid"]
-
-        wait_for_splunk_job(session, search_url, sid)
-
-        results_url = f"{search_url}/{sid}/results"
-        results_response = session.get(results_url, params={"output_mode": "json", "count": 50})
-        results = results_response.json()
-
-        for result in results.get("results", []):
-            if "_raw" in result:
-                matching_logs.append(result["_raw"])
-
-        extracted_fields = []
-        for line in matching_logs:
-            fields = {}
-            fields["service"] = re.search(r'service=(\w+)', line).group(1) if re.search(r'service=(\w+)',
-                                                                                        line) else None
-            fields["error_code"] = re.search(r'error_code=(\w+)', line).group(1) if re.search(r'error_code=(\w+)',
-                                                                                              line) else None
-            extracted_fields.append(fields)
-
-        return extracted_fields, sid
-    except requests.exceptions.RequestException as e:
+        started = time.perf_counter()
+        with span("splunk.search", backend=LOG_BACKEND, exec_mode=exec_mode) as search:
+            results, sid = call_streaming_backend(LOG_BACKEND, LOG_BACKENDS[LOG_BACKEND], queryKeywords, exec_mode)
+            search.set("sid", sid)
+        set_trace_attribute("splunk_sid", sid)
+        return iter_unique_log_fields(results, exec_mode, started), sid
+    except (requests.exceptions.RequestException, CircuitOpen) as e:
         logging.error(f"Error querying Splunk: {e}")
-        return [], None
+        mark_degraded("splunk")
+        return iter([]), None
+
+
+def extract_matching_logs_from_splunk(queryKeywords, exec_mode=None):
+    def run_search():
+        extracted_fields, sid = stream_matching_logs_from_splunk(queryKeywords, exec_mode)
+        return list(extracted_fields), sid
+
+    keywords = json.loads(queryKeywords) if isinstance(queryKeywords, str) else queryKeywords
+    return batch_lookup(("splunk", normalize_keywords(keywords), exec_mode), run_search)
+
+
+def use_trace_mode(queryKeywords):
+    mode = SPLUNK_TRACE_CONFIG.get("mode", "auto")
+    if mode == "auto":
+        keywords = json.loads(queryKeywords) if isinstance(queryKeywords, str) else queryKeywords
+        return bool(keywords.get("correlation_id"))
+    return mode == "always"
+
+
+def extract_log_timelines(queryKeywords, exec_mode=None):
+    # Trace mode: the event chains of the matching errors as timelines, plus the Splunk job sid
+    if isinstance(queryKeywords, str):
+        queryKeywords = json.loads(queryKeywords)
+    if LOG_BACKEND not in TRACE_BACKENDS:
+        raise ValueError(f"Unknown log_backend '{LOG_BACKEND}', expected one of {sorted(TRACE_BACKENDS)}")
+    exec_mode = LOG_BACKEND if LOG_BACKEND != "splunk" else (exec_mode or SPLUNK_EXEC_MODE)
+
+    def fetch_rows():
+        rows, sid = TRACE_BACKENDS[LOG_BACKEND](queryKeywords, exec_mode)
+        return list(rows), sid
+
+    def run_search():
+        started = time.perf_counter()
+        try:
+            with span("splunk.trace", backend=LOG_BACKEND, exec_mode=exec_mode) as search:
+                rows, sid = call_backend(LOG_BACKEND, fetch_rows)
+                search.set("sid", sid)
+                timelines = []
+                for row in rows:
+                    record_payload("splunk", sum(len(event) for event in row.get("events") or []))
+                    timelines.append(build_timeline(row, SPLUNK_TRACE_CONFIG.get("max_events", 25)))
+                search.set("traces", len(timelines))
+                search.set("events", sum(timeline["event_count"] for timeline in timelines))
+        except (requests.exceptions.RequestException, CircuitOpen) as e:
+            logging.error(f"Error querying Splunk: {e}")
+            mark_degraded("splunk")
+            return [], None
+        record_splunk_job_timing(exec_mode, time.perf_counter() - started)
+        set_trace_attribute("splunk_sid", sid)
+        return timelines, sid
+
+    return batch_lookup(("trace", normalize_keywords(queryKeywords), exec_mode), run_search)
+
+
+def strip_storage_html(body_html):
+    return render_sections(parse_storage_format(body_html))
 
 
-def query_confluence_for_keywords(keywords):
+def build_confluence_page(page):
+    title = page.get("title", "")
+    body_html = page.get("body", {}).get("storage", {}).get("value", "")
+    # Parsed once per page version: the result is what confluence_cache stores under (id, version)
+    sections = parse_named_sections(body_html, CONFLUENCE_SECTIONS) if CONFLUENCE_SECTIONS \
+        else parse_storage_format(body_html)
+    text = render_sections(sections)[:CONTEXT_BUDGET_CONFIG.get("max_page_chars", 20000)]
+
+    base_url = page.get("_links", {}).get("base", CONFLUENCE_BASE_URL)
+    if base_url.endswith("/rest/api"):
+        base_url = base_url[:-9]  # Remove "/rest/api" from the end
+    web_path = page.get("_links", {}).get("webui", "")
+    logging.info("base_url: %s", base_url)
+    logging.info("web_path: %s", web_path)
+    readable_url = f"{base_url}{web_path}"
+
+    return {
+        "id": page.get("id"),
+        "version": page.get("version", {}).get("number"),
+        "title": title,
+        "snippet": text[:1000],
+        "text": text,
+        "url": readable_url,
+    }
+
+
+def fetch_confluence_page(session, page_id):
     headers = {"Accept": "application/json"}
-    auth = (CONFLUENCE_EMAIL, confluence_token)
+    url = f"{CONFLUENCE_BASE_URL}/content/{page_id}?expand=body.storage,version"
+    response = session.get(url, headers=headers, timeout=CONFLUENCE_SEARCH_TIMEOUT)
+    response.raise_for_status()
+    return build_confluence_page(response.json())
+
+
+def confluence_search_cql(keyword):
+    return f"text~\"{' '.join(str(keyword).split())}\""
+
+
+def search_confluence_pages(session, keyword):
+    headers = {"Accept": "application/json"}
+    cql = confluence_search_cql(keyword)
+    with span("confluence.search") as search:
+        try:
+            pages = batch_lookup(("confluence", cql), lambda: search_confluence_cql(session, headers, cql, search))
+        except (requests.exceptions.RequestException, CircuitOpen) as e:
+            logging.warning(f"Confluence search for {keyword} failed ({e}); answering from cached or local runbooks")
+            pages = degraded_confluence_pages(keyword, cql)
+            search.set("degraded", True)
+        search.set("pages", len(pages))
+        return pages
+
+
+def degraded_confluence_pages(keyword, cql):
+    # An expired cache entry for the same search, else the local runbook index if it has been built
+    mark_degraded("confluence")
+    if confluence_cache:
+        cached_pages, _ = confluence_cache.get_search(cql)
+        if cached_pages is not None:
+            return cached_pages
+    index = runbook_index or load_fallback_runbook_index()
+    return index.search(index_query_text(keyword), RUNBOOK_INDEX_TOP_K) if index else []
+
+
+@functools.lru_cache(maxsize=None)
+def load_fallback_runbook_index():
+    return RunbookIndex.load(RUNBOOK_INDEX_CONFIG.get("path", ".cache/runbook_index"))
+
+
+def get_confluence_search(session, url, headers):
+    # Raises on 5xx so the circuit breaker counts it; a duplicate request is sent when the first one
+    # is slower than the recent hedge_percentile latency
+    def get():
+        response = session.get(url, headers=headers, timeout=CONFLUENCE_SEARCH_TIMEOUT)
+        if response.status_code >= 500:
+            response.raise_for_status()
+        return response
+
+    if not CONFLUENCE_HEDGING_CONFIG.get("enabled", True):
+        return get()
+    breaker = circuit_breakers.get("confluence")
+    hedge_after = breaker.latency_percentile(CONFLUENCE_HEDGING_CONFIG.get("hedge_percentile", 95)) if breaker else None
+    if hedge_after is None:
+        hedge_after = CONFLUENCE_HEDGING_CONFIG.get("hedge_after", 1.0)
+    return hedged_call(hedge_executor, max(hedge_after, CONFLUENCE_HEDGING_CONFIG.get("min_hedge_after", 0.05)), get)
+
+
+def search_confluence_cql(session, headers, cql, search):
+    cached_pages, is_fresh = confluence_cache.get_search(cql) if confluence_cache else (None, False)
+    if is_fresh:
+        search.set("cache", "hit")
+        return cached_pages
+
+    # A stale entry is revalidated with a version-only search; only changed pages are downloaded again
+    search.set("cache", "revalidate" if cached_pages is not None else "miss")
+    expand = "version" if cached_pages is not None else "body.storage,version"
+    url = f"{CONFLUENCE_BASE_URL}/content/search?cql={cql}&expand={expand}"
+    response = call_backend("confluence", get_confluence_search, session, url, headers)
+    record_payload("confluence", len(response.content))
+
+    if response.status_code != 200:
+        logging.error(f"Error: Received status code {response.status_code} with response: {response.text}")
+        return cached_pages or []
+
+    pages = []
+    for result in response.json().get("results", []):
+        version = result.get("version", {}).get("number")
+        page = None
+        if confluence_cache and version is not None:
+            page = confluence_cache.get_page(result.get("id"), version)
+        if page is None:
+            if "body" in result:
+                page = build_confluence_page(result)
+            else:
+                page = fetch_confluence_page(session, result["id"])
+                search.add("pages_fetched", 1)
+            if confluence_cache and page["version"] is not None:
+                confluence_cache.put_page(page)
+        pages.append(page)
+
+    if confluence_cache:
+        confluence_cache.put_search(cql, pages)
+    return pages
+
+
+def list_confluence_page_versions(session, space_key):
+    headers = {"Accept": "application/json"}
+    url = f"{CONFLUENCE_BASE_URL}/content"
+    params = {"spaceKey": space_key, "type": "page", "expand": "version", "limit": 100, "start": 0}
+    while True:
+        response = session.get(url, headers=headers, params=params, timeout=CONFLUENCE_SEARCH_TIMEOUT)
+        response.raise_for_status()
+        data = response.json()
+        results = data.get("results", [])
+        for page in results:
+            yield page["id"], page.get("version", {}).get("number")
+        if not results or "next" not in data.get("_links", {}):
+            return
+        params["start"] += len(results)
+
+
+def sync_confluence_runbook_index(space_key, index_dir=None):
+    session = setup_confluence_session()
+    headers = {"Accept": "application/json"}
+
+    def fetch_page(page_id):
+        url = f"{CONFLUENCE_BASE_URL}/content/{page_id}?expand=body.storage,version"
+        response = session.get(url, headers=headers, timeout=CONFLUENCE_SEARCH_TIMEOUT)
+        response.raise_for_status()
+        page = response.json()
+        return build_confluence_page(page), page.get("body", {}).get("storage", {}).get("value", "")
+
+    return sync_runbook_index(index_dir or RUNBOOK_INDEX_CONFIG.get("path", ".cache/runbook_index"),
+                              list_confluence_page_versions(session, space_key), fetch_page, strip_storage_html)
+
+
+def merge_confluence_pages(page_lists):
     context_snippets = []
     confluence_urls = []
+    seen_page_ids = set()
+    for pages in page_lists:
+        for page in pages:
+            if page["id"] is not None and page["id"] in seen_page_ids:
+                continue
+            seen_page_ids.add(page["id"])
+            context_snippets.append(f"{page['title']}: {page['snippet']}")
+            confluence_urls.append(f"{page['title']}: {page['url']}")
+    return context_snippets, confluence_urls
 
-    for keyword in keywords:
-        url = f"{CONFLUENCE_BASE_URL}/content/search?cql=text~\"{keyword}\"&expand=body.storage"
-        response = requests.get(url, headers=headers, auth=auth)
-
-        if response.status_code == 200:
-            data = response.json()
-            for page in data.get("results", []):
-                title = page.get("title", "")
-                body_html = page.get("body", {}).get("storage", {}).get("value", "")
-                snippet = re.sub('<[^<]+?>', '', body_html).strip().replace("\n", " ")[:1000]
-
-                base_url = page.get("_links", {}).get("base", CONFLUENCE_BASE_URL)
-                if base_url.endswith("/rest/api"):
-                    base_url = base_url[:-9]  # Remove "/rest/api" from the end
-                web_path = page.get("_links", {}).get("webui", "")
-                logging.info("base_url: %s", base_url)
-                logging.info("web_path: %s", web_path)
-                readable_url = f"{base_url}{web_path}"
-
-                context_snippets.append(f"{title}: {snippet}")
-                confluence_urls.append(f"{title}: {readable_url}")
-        else:
-            logging.error(f"Error: Received status code {response.status_code} with response: {response.text}")
 
-    return context_snippets, confluence_urls
+def iter_confluence_page_lists(keywords):
+    with span("confluence", source="index" if runbook_index is not None else "confluence", pages=0) as lookup:
+        for pages in iter_confluence_search_results(keywords):
+            lookup.add("pages", len(pages))
+            yield pages
+
+
+def iter_confluence_search_results(keywords):
+    if runbook_index is not None:
+        # Served from the local index built by scripts/sync_runbook_index.py, no Atlassian round-trip
+        for keyword in keywords:
+            yield runbook_index.search(index_query_text(keyword), RUNBOOK_INDEX_TOP_K)
+        return
+
+    session = setup_confluence_session()
+
+    # Searches start as soon as each keyword arrives; results are yielded in keyword order.
+    # Each search runs in a copy of the caller's context so its span lands in the same trace.
+    searches = [(keyword, time.monotonic(), confluence_executor.submit(contextvars.copy_context().run,
+                                                                       search_confluence_pages, session, keyword))
+                for keyword in keywords]
+
+    for keyword, submitted_at, future in searches:
+        remaining = submitted_at + CONFLUENCE_SEARCH_TIMEOUT - time.monotonic()
+        try:
+            yield future.result(timeout=max(remaining, 0))
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            logging.error(f"Confluence search for {keyword} timed out after {CONFLUENCE_SEARCH_TIMEOUT}s")
+            yield degraded_confluence_pages(keyword, confluence_search_cql(keyword))
+        except requests.exceptions.RequestException as e:
+            logging.error(f"Error querying Confluence for {keyword}: {e}")
+
 
+def build_confluence_context(page_lists, *keyword_sources):
+    # Packs the most relevant passages into the prompt's token budget; with the budget disabled,
+    # every page's first 1000 characters are used as before
+    if not CONTEXT_BUDGET_CONFIG.get("enabled", True):
+        return merge_confluence_pages(page_lists)
 
-def generate_response(user_prompt, confluence_snippets, splunk_search_url=None, confluence_doc_urls=None):
+    with span("context") as assembly:
+        snippets, urls, stats = assemble_context(
+            page_lists, relevance_terms(*keyword_sources),
+            max_tokens=CONTEXT_BUDGET_CONFIG.get("max_tokens", 1500),
+            passage_tokens=CONTEXT_BUDGET_CONFIG.get("passage_tokens", 150))
+        for key, value in stats.items():
+            assembly.set(key, value)
+    logging.info('Context: %d of %d passages from %d pages, %d tokens (%d with 1000-character snippets)',
+                 stats["selected"], stats["passages"], stats["pages"], stats["context_tokens"], stats["snippet_tokens"])
+    return snippets, urls
+
+
+def query_confluence_for_keywords(keywords, queryKeywords=None, prefetched=None):
+    # Keywords may be a lazy stream of Splunk fields; keep them for ranking as they are consumed.
+    # prefetched is (keywords, future of their page lists) started earlier; those keywords are not searched again.
+    seen_keywords = list(prefetched[0]) if prefetched else []
+
+    def remember(keywords):
+        for keyword in keywords:
+            if prefetched and keyword in prefetched[0]:
+                continue
+            seen_keywords.append(keyword)
+            yield keyword
+
+    page_lists = list(iter_confluence_page_lists(remember(keywords)))
+    if prefetched:
+        try:
+            page_lists = prefetched[1].result(timeout=PIPELINE_STAGE_TIMEOUTS.get("confluence")) + page_lists
+        except concurrent.futures.TimeoutError:
+            logging.error("confluence stage timed out after %ss", PIPELINE_STAGE_TIMEOUTS.get("confluence"))
+    return build_confluence_context(page_lists, seen_keywords, [queryKeywords] if queryKeywords else [])
+
+
+def build_response_prompt(user_prompt, confluence_snippets, splunk_search_url=None, confluence_doc_urls=None,
+                          log_timelines=None):
     confluence_links_text = "\n".join(confluence_doc_urls) if confluence_doc_urls else "No Confluence links available."
     splunk_link_text = splunk_search_url if splunk_search_url else "No Splunk link available."
+    timeline_section = ""
+    if log_timelines:
+        timeline_section = ("\nLog Timeline (every event sharing the error's correlation_id, in order):\n"
+                            + "\n\n".join(format_timeline(timeline) for timeline in log_timelines) + "\n")
     prompt_template = """
 You are a helpful assistant that uses Confluence data to answer user questions.
 
 Confluence Snippets:
 {confluence_snippets}
-
+{timeline_section}
 User Query:
 {user_prompt}
 
@@ -173,25 +925,75 @@ Splunk Logs: {splunk_link_text}
 Confluence Pages: 
 {confluence_links_text}
 """
-    prompt = prompt_template.format(
+    return prompt_template.format(
         confluence_snippets="\n".join(confluence_snippets),
+        timeline_section=timeline_section,
         user_prompt=user_prompt,
         splunk_link_text=splunk_link_text,
         confluence_links_text=confluence_links_text
     )
 
-    response = client.chat.completions.create(
-        model="gpt-3.5-turbo",
-        messages=[
-            {"role": "system", "content": "You are a helpful assistant."},
-            {"role": "user", "content": prompt}
-        ]
-    )
-    return response.choices[0].message.content
 
+def wait_for_openai_slot():
+    if openai_rate_limiter is not None:
+        openai_rate_limiter.acquire(1)
 
-def extract_keywords_with_llm(user_query):
-    prompt = f"""
+
+def create_answer_completion(prompt, **kwargs):
+    # The answer stage timeout applies to each OpenAI request; AnswerTimeout tells callers to apologise instead
+    client = get_openai_client()
+    from openai import APITimeoutError  # Already imported by get_openai_client
+    try:
+        return client.chat.completions.create(
+            model="gpt-3.5-turbo",
+            messages=[
+                {"role": "system", "content": "You are a helpful assistant."},
+                {"role": "user", "content": prompt}
+            ],
+            timeout=PIPELINE_STAGE_TIMEOUTS.get("answer"),
+            **kwargs
+        )
+    except APITimeoutError as e:
+        logging.error("answer stage timed out after %ss", PIPELINE_STAGE_TIMEOUTS.get("answer"))
+        raise AnswerTimeout() from e
+
+
+def generate_response(user_prompt, confluence_snippets, splunk_search_url=None, confluence_doc_urls=None,
+                      log_timelines=None):
+    prompt = build_response_prompt(user_prompt, confluence_snippets, splunk_search_url, confluence_doc_urls,
+                                   log_timelines)
+
+    with span("answer", prompt_bytes=len(prompt)):
+        wait_for_openai_slot()
+        response = create_answer_completion(prompt)
+        record_token_usage(response.usage)
+        record_payload("answer", len(prompt) + len(response.choices[0].message.content or ""))
+        return response.choices[0].message.content
+
+
+def generate_response_stream(user_prompt, confluence_snippets, splunk_search_url=None, confluence_doc_urls=None,
+                             log_timelines=None):
+    prompt = build_response_prompt(user_prompt, confluence_snippets, splunk_search_url, confluence_doc_urls,
+                                   log_timelines)
+
+    with span("answer", prompt_bytes=len(prompt), streamed=True) as answer:
+        wait_for_openai_slot()
+        stream = create_answer_completion(prompt, stream=True, stream_options={"include_usage": True})
+        response_bytes = 0
+        for chunk in stream:
+            # With include_usage the last chunk carries the token counts and no choices
+            if getattr(chunk, "usage", None):
+                record_token_usage(chunk.usage)
+            if chunk.choices and chunk.choices[0].delta.content:
+                if not response_bytes:
+                    answer.set("first_token_ms", round((time.perf_counter() - answer.started) * 1000, 2))
+                response_bytes += len(chunk.choices[0].delta.content)
+                yield chunk.choices[0].delta.content
+        record_payload("answer", len(prompt) + response_bytes)
+
+
+def build_keyword_prompt(user_query):
+    return f"""
 You are a helpful assistant. Extract the following structured information from the user's query:
 
 - service names (like checkout-service, mandate, etc.)
@@ -209,43 +1011,255 @@ Return your answer in this format:
 
 User query: "{user_query}"
     """
-    response = client.chat.completions.create(
+
+
+def extract_keywords_with_llm(user_query):
+    prompt = build_keyword_prompt(user_query)
+    wait_for_openai_slot()
+    response = get_openai_client().chat.completions.create(
         model="gpt-3.5-turbo",
         messages=[
             {"role": "system", "content": "You are a helpful assistant."},
             {"role": "user", "content": prompt}
         ]
     )
+    record_token_usage(response.usage)
     return response.choices[0].message.content
 
 
-def process_user_query(user_query):
-    queryKeywords = extract_keywords_with_llm(user_query)
+def record_keyword_extraction(method, elapsed):
+    if method == "fast_path":
+        keyword_extractor.record_fast_path(elapsed)
+    else:
+        keyword_extractor.record_llm_fallback(elapsed)
+    keyword_extractions.inc(method)
+    keyword_extraction_seconds.inc(method, elapsed)
+
+
+def extract_keywords(user_query):
+    # Deterministic fast path first; the LLM only sees queries the rules cannot make sense of
+    with span("keywords", query_bytes=len(user_query)) as extraction:
+        started = time.perf_counter()
+        keywords, confidence = keyword_extractor.extract(user_query)
+        extraction.set("confidence", round(confidence, 2))
+        if confidence >= KEYWORD_FAST_PATH_MIN_CONFIDENCE:
+            record_keyword_extraction("fast_path", time.perf_counter() - started)
+            extraction.set("method", "fast_path")
+            logging.info('Fast-path keyword extraction (confidence %.2f)', confidence)
+            return json.dumps(keywords)
+
+        extraction.set("method", "llm")
+        started = time.perf_counter()
+        queryKeywords = extract_keywords_with_llm(user_query)
+        record_keyword_extraction("llm", time.perf_counter() - started)
+        logging.debug('Keyword extraction stats: %s', keyword_extractor.stats())
+        return queryKeywords
+
+
+def query_keyword_fields(keywords):
+    # Without Splunk, runbooks are looked up by the error codes and services named in the question itself
+    services = [normalize_service_name(service) for service in keywords.get("services", [])]
+    fields = [{"service": services[0] if services else None, "error_code": error}
+              for error in keywords.get("errors", [])]
+    return fields or [{"service": service, "error_code": None} for service in services]
+
+
+def gather_answer_context(queryKeywords, on_status=None):
+    report_status = on_status or (lambda message: None)
+    keywords = json.loads(queryKeywords) if isinstance(queryKeywords, str) else queryKeywords
+
+    prefetched = None
+    if CONFLUENCE_PREFETCH:
+        # Runbooks for the question's own error codes and services are looked up while the Splunk job runs,
+        # then refined with whatever else Splunk finds
+        query_fields = query_keyword_fields(keywords)
+        prefetched = (query_fields, prefetch_executor.submit(contextvars.copy_context().run,
+                                                             lambda: list(iter_confluence_page_lists(query_fields))))
+
+    report_status("Searching Splunk logs...")
+    log_timelines = None
+    if use_trace_mode(queryKeywords):
+        # The whole event chain comes back in one job; its ERROR events drive the runbook lookup
+        log_timelines, sid = extract_log_timelines(queryKeywords)
+        splunk_keywords = timeline_error_fields(log_timelines)
+        logging.info('Extracted Splunk Keywords from %d traces:  %s', len(log_timelines), splunk_keywords)
+    elif SPLUNK_STREAM_RESULTS and batch_lookups is None:
+        # Confluence lookups consume the Splunk fields as they stream in
+        splunk_keywords, sid = stream_matching_logs_from_splunk(queryKeywords)
+    else:
+        splunk_keywords, sid = extract_matching_logs_from_splunk(queryKeywords)
+        logging.info('Extracted Splunk Keywords:  %s', splunk_keywords)
+    if is_degraded("splunk"):
+        splunk_keywords = query_keyword_fields(keywords)
+    report_status("Searching Confluence runbooks...")
+    confluence_snippets, confluence_doc_urls = query_confluence_for_keywords(splunk_keywords, keywords, prefetched)
+    logging.info('Confluence Snippets:  %s', confluence_snippets)
+    if confluence_cache:
+        logging.debug('Confluence cache stats: %s', confluence_cache.stats())
+    splunk_search_url = f"{SPLUNK_DOMAIN}/app/search/search?sid={sid}" if sid else None
+    logging.debug('HTTP pool stats: %s', pool_stats())
+
+    return {
+        "confluence_snippets": confluence_snippets,
+        "splunk_search_url": splunk_search_url,
+        "confluence_doc_urls": confluence_doc_urls,
+        "log_timelines": log_timelines,
+    }
+
+
+def find_similar_answer(user_query, request):
+    # A recent answer to a near-duplicate question, found before any keyword extraction or backend call
+    semantic_cache = get_semantic_cache()
+    if semantic_cache is None:
+        return None
+    with span("semantic_cache") as lookup:
+        match = semantic_cache.get(user_query)
+        lookup.set("hit", match is not None)
+    if match is None:
+        return None
+    logging.info('Serving the answer to a similar question (similarity %.2f): %s', match["similarity"],
+                 match["question"])
+    request.attributes["outcome"] = "similar"
+    request.attributes["similarity"] = match["similarity"]
+    return match["answer"]
+
+
+def note_degraded_answer(degraded, request):
+    # Counts the answer against each backend it had to do without and returns the note appended to it
+    for backend in sorted(degraded):
+        degraded_answers.inc(backend)
+    request.attributes["outcome"] = "degraded"
+    request.attributes["degraded"] = sorted(degraded)
+    return DEGRADED_ANSWER_NOTE.format(backends=" and ".join(BACKEND_NAMES.get(backend, backend)
+                                                              for backend in sorted(degraded)))
+
+
+def remember_answer(user_query, response):
+    semantic_cache = get_semantic_cache()
+    if semantic_cache is not None:
+        semantic_cache.put(user_query, response)
+
+
+def find_ready_answer(user_query, request, report_status):
+    # Returns (answer, None, None) when the question needs no pipeline run: a similar question's answer,
+    # a refusal or a cached answer. Otherwise (None, queryKeywords, cache_key).
+    similar_response = find_similar_answer(user_query, request)
+    if similar_response is not None:
+        return similar_response, None, None
+
+    report_status("Understanding your question...")
+    queryKeywords = extract_keywords(user_query)
     logging.info('Extracted Query Keywords:  %s', queryKeywords)
 
     # Parse the extracted keywords
     keywords = json.loads(queryKeywords)
     if not any(keywords.values()):  # Check if all lists are empty
-        return ("I am sorry but I cannot respond to this query. I can help you find out a solution"
-                " for your error if you provide me with either the service name, error type, correlation_id or endpoint.")
+        request.attributes["outcome"] = "refused"
+        return NO_KEYWORDS_RESPONSE, None, None
 
-    splunk_keywords, sid = extract_matching_logs_from_splunk(queryKeywords)
-    logging.info('Extracted Splunk Keywords:  %s', splunk_keywords)
-    confluence_snippets, confluence_doc_urls = query_confluence_for_keywords(splunk_keywords)
-    logging.info('Confluence Snippets:  %s', confluence_snippets)
-    splunk_search_url = f"{SPLUNK_DOMAIN}/app/search/search?sid={sid}" if sid else None
+    cache_key = normalize_keywords(keywords)
+    request.attributes["keywords"] = cache_key
+    cached_response = response_cache.get(cache_key)
+    if cached_response is not None:
+        logging.info('Serving cached answer for %s', cache_key)
+        request.attributes["outcome"] = "cached"
+        return cached_response, None, None
+    return None, queryKeywords, cache_key
+
+
+def settle_answer(user_query, cache_key, response, degraded, request):
+    # Caches a complete answer. A degraded one is not cached, so the question gets a full answer again
+    # once the backend recovers; the note to append to it is returned instead.
+    if degraded:
+        return note_degraded_answer(degraded, request)
+    response_cache.put(cache_key, response)
+    remember_answer(user_query, response)
+    request.attributes["outcome"] = "answered"
+    return ""
 
-    return generate_response(
-        user_query,
-        confluence_snippets,
-        splunk_search_url=splunk_search_url,
-        confluence_doc_urls=confluence_doc_urls
-    )
+
+def process_user_query(user_query):
+    with trace("process_user_query") as request, track_degraded() as degraded:
+        ready_response, queryKeywords, cache_key = find_ready_answer(user_query, request, lambda message: None)
+        if ready_response is not None:
+            return ready_response
+
+        def run_pipeline():
+            try:
+                response = generate_response(user_query, **gather_answer_context(queryKeywords))
+            except AnswerTimeout:
+                request.attributes["outcome"] = "timed_out"
+                return ANSWER_TIMEOUT_RESPONSE.format(timeout=PIPELINE_STAGE_TIMEOUTS.get("answer"))
+            return response + settle_answer(user_query, cache_key, response, degraded, request)
+
+        # Identical questions asked while the pipeline is running wait for its answer
+        response = query_coalescer.run(cache_key, run_pipeline)
+        request.attributes.setdefault("outcome", "answered")
+        return response
+
+
+def process_user_query_stream(user_query, on_status=None):
+    # Yields the answer token by token; on_status receives a label for each pipeline stage
+    report_status = on_status or (lambda message: None)
+
+    with trace("process_user_query_stream") as request, track_degraded() as degraded:
+        ready_response, queryKeywords, cache_key = find_ready_answer(user_query, request, report_status)
+        if ready_response is not None:
+            yield ready_response
+            return
+
+        context = gather_answer_context(queryKeywords, on_status=report_status)
+        report_status("Writing the answer...")
+        chunks = []
+        try:
+            for token in generate_response_stream(user_query, **context):
+                chunks.append(token)
+                yield token
+        except AnswerTimeout:
+            request.attributes["outcome"] = "timed_out"
+            yield ANSWER_TIMEOUT_RESPONSE.format(timeout=PIPELINE_STAGE_TIMEOUTS.get("answer"))
+            return
+        note = settle_answer(user_query, cache_key, "".join(chunks), degraded, request)
+        if note:
+            yield note
+
+
+def run_batch_queries(input_path, output_path, parallelism=None, openai_rpm=None, resume=False):
+    # Questions in a batch share Splunk and Confluence lookups, and OpenAI calls are spaced out to openai_rpm
+    global batch_lookups, openai_rate_limiter
+    parallelism = parallelism or BATCH_CONFIG.get("parallelism", 4)
+    openai_rpm = openai_rpm or BATCH_CONFIG.get("openai_requests_per_minute")
+    batch_lookups = LookupMemo()
+    openai_rate_limiter = RateLimiter(openai_rpm / 60) if openai_rpm else None
+    try:
+        summary = run_batch(load_batch_questions(input_path), output_path, process_user_query,
+                            parallelism=parallelism, resume=resume)
+        summary["shared_lookups"] = batch_lookups.stats()
+        return summary
+    finally:
+        batch_lookups = None
+        openai_rate_limiter = None
 
 
 def main():
-    if len(sys.argv) > 1:
-        user_query = sys.argv[1]
+    parser = argparse.ArgumentParser(description="Answer a question, or a batch of questions, from logs and runbooks.")
+    parser.add_argument("query", nargs="?", help="question to answer (prompted for when omitted)")
+    parser.add_argument("--batch", metavar="INPUT", help="JSON or NDJSON file of questions to answer in bulk")
+    parser.add_argument("--output", default="batch_results.ndjson", help="NDJSON file the batch results stream to")
+    parser.add_argument("--parallelism", type=int, default=None, help="questions answered concurrently")
+    parser.add_argument("--openai-rpm", type=float, default=None, help="max OpenAI requests per minute")
+    parser.add_argument("--resume", action="store_true", help="skip questions already answered in --output")
+    args = parser.parse_args()
+
+    start_metrics_endpoint()
+    prepare_log_backend()
+    if args.batch:
+        summary = run_batch_queries(args.batch, args.output, parallelism=args.parallelism,
+                                    openai_rpm=args.openai_rpm, resume=args.resume)
+        return json.dumps(summary, indent=2)
+
+    if args.query:
+        user_query = args.query
         response = process_user_query(user_query)
         return response
     else:
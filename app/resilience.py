@@ -0,0 +1,191 @@
+import concurrent.futures
+import contextlib
+import contextvars
+import logging
+import threading
+import time
+from collections import deque
+
+from tracing import breaker_trips, hedged_requests
+
+_degraded_backends = contextvars.ContextVar("degraded_backends", default=None)
+
+
+class CircuitOpen(Exception):
+    def __init__(self, backend, retry_after):
+        super().__init__(f"{backend} circuit is open, retrying in {retry_after:.0f}s")
+        self.backend = backend
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    # Closed: calls go through and their latency and outcome are kept for the last `window` calls.
+    # Opens after failure_threshold consecutive failures, or when more than slow_call_rate of the window
+    # took longer than slow_call_seconds. Open: calls fail fast with CircuitOpen for reset_timeout
+    # seconds. Half-open: one trial call; success closes the circuit, failure or a slow call reopens it.
+    # A trial that is never recorded (a streaming call whose results were dropped unread) expires after
+    # reset_timeout and another call gets to try.
+
+    def __init__(self, name, failure_threshold=5, slow_call_seconds=10.0, slow_call_rate=0.5, window=20,
+                 min_calls=5, reset_timeout=30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.min_calls = min_calls
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.trips = 0
+        self._calls = deque(maxlen=window)
+        self._consecutive_failures = 0
+        self._opened_at = None
+        self._trial_running = False
+        self._trial_started = None
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == "open":
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self.state = "half_open"
+                self._trial_running = False
+            if self.state == "half_open":
+                if self._trial_running and time.monotonic() - self._trial_started < self.reset_timeout:
+                    return False
+                self._trial_running = True
+                self._trial_started = time.monotonic()
+            return True
+
+    def record(self, elapsed, ok):
+        slow = elapsed > self.slow_call_seconds
+        with self._lock:
+            self._calls.append((elapsed, ok))
+            self._consecutive_failures = 0 if ok else self._consecutive_failures + 1
+            if self.state == "half_open":
+                self._trial_running = False
+                if ok and not slow:
+                    self.state = "closed"
+                    self._calls.clear()
+                    logging.info("%s circuit closed after a successful trial call", self.name)
+                else:
+                    self._trip(f"trial call {'was slow' if ok else 'failed'}")
+                return
+            if self.state != "closed":
+                return
+            if self._consecutive_failures >= self.failure_threshold:
+                self._trip(f"{self._consecutive_failures} consecutive failures")
+            elif len(self._calls) >= self.min_calls:
+                slow_calls = sum(1 for call_elapsed, _ in self._calls if call_elapsed > self.slow_call_seconds)
+                if slow_calls > self.slow_call_rate * len(self._calls):
+                    self._trip(f"{slow_calls} of the last {len(self._calls)} calls took over "
+                               f"{self.slow_call_seconds}s")
+
+    def _trip(self, reason):
+        self.state = "open"
+        self._opened_at = time.monotonic()
+        self.trips += 1
+        breaker_trips.inc(self.name)
+        logging.warning("%s circuit opened: %s", self.name, reason)
+
+    def call(self, func, *args, **kwargs):
+        if not self.allow():
+            raise CircuitOpen(self.name, max(self.reset_timeout - (time.monotonic() - self._opened_at), 0))
+        started = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            self.record(time.perf_counter() - started, False)
+            raise
+        self.record(time.perf_counter() - started, True)
+        return result
+
+    def call_streaming(self, func, *args, **kwargs):
+        # For a func returning (results, extra) whose results iterator does the remote work lazily: the call
+        # is recorded once the results run out, fail or are closed, with the time spent waiting on them
+        if not self.allow():
+            raise CircuitOpen(self.name, max(self.reset_timeout - (time.monotonic() - self._opened_at), 0))
+        started = time.perf_counter()
+        try:
+            results, extra = func(*args, **kwargs)
+        except Exception:
+            self.record(time.perf_counter() - started, False)
+            raise
+        return self._record_when_done(iter(results), time.perf_counter() - started), extra
+
+    def _record_when_done(self, results, elapsed):
+        ok = True
+        try:
+            while True:
+                resumed = time.perf_counter()
+                try:
+                    result = next(results)
+                except StopIteration:
+                    return
+                except Exception:
+                    ok = False
+                    raise
+                finally:
+                    elapsed += time.perf_counter() - resumed
+                yield result
+        finally:
+            self.record(elapsed, ok)
+
+    def latency_percentile(self, percentile):
+        # Latency of recent successful calls, or None until min_calls of them have been seen
+        with self._lock:
+            latencies = sorted(elapsed for elapsed, ok in self._calls if ok)
+        if len(latencies) < self.min_calls:
+            return None
+        return latencies[min(len(latencies) - 1, int(len(latencies) * percentile / 100))]
+
+    def stats(self):
+        with self._lock:
+            return {"state": self.state, "trips": self.trips, "recent_calls": len(self._calls),
+                    "consecutive_failures": self._consecutive_failures}
+
+
+def hedged_call(executor, hedge_after, func, *args):
+    # Runs func and, if it has not returned after hedge_after seconds, a duplicate of it; the first
+    # to succeed wins. The slower one is left to finish on its own, bounded by the request timeout.
+    primary = executor.submit(func, *args)
+    done, _ = concurrent.futures.wait([primary], timeout=hedge_after)
+    if done:
+        return primary.result()
+    hedge = executor.submit(func, *args)
+    hedged_requests.inc("sent")
+    pending = {primary, hedge}
+    error = None
+    while pending:
+        done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                hedged_requests.inc("won" if future is hedge else "lost")
+                return future.result()
+            error = future.exception()
+    raise error
+
+
+@contextlib.contextmanager
+def track_degraded():
+    # Collects the backends a request had to do without; threads started with a copy of the
+    # context share the same set
+    backends = set()
+    token = _degraded_backends.set(backends)
+    try:
+        yield backends
+    finally:
+        try:
+            _degraded_backends.reset(token)
+        except ValueError:
+            pass  # A generator closed from another context
+
+
+def mark_degraded(backend):
+    backends = _degraded_backends.get()
+    if backends is not None:
+        backends.add(backend)
+
+
+def is_degraded(backend):
+    return backend in (_degraded_backends.get() or ())
@@ -0,0 +1,117 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+def normalize_keywords(keywords):
+    # Same services/errors/ids in any order or case produce the same key
+    return json.dumps(
+        {field: sorted({str(value).strip().lower() for value in values})
+         for field, values in keywords.items() if values},
+        sort_keys=True,
+    )
+
+
+class ResponseCache:
+    def __init__(self, ttl=60, max_entries=512):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[0] >= self.ttl:
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class _InFlightCall:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class RequestCoalescer:
+    # Concurrent calls with the same key share a single execution of func
+
+    def __init__(self):
+        self.coalesced = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def run(self, key, func):
+        with self._lock:
+            call = self._calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = self._calls[key] = _InFlightCall()
+            else:
+                self.coalesced += 1
+
+        if not is_leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+class LookupMemo:
+    # Remembers every result for the lifetime of the memo (one batch run), and concurrent
+    # lookups of the same key share a single call
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._results = {}
+        self._coalescer = RequestCoalescer()
+        self._lock = threading.Lock()
+
+    def get_or_run(self, key, func, remember=None):
+        # remember(result) returning False keeps a result (a failed lookup) from being reused by later lookups
+        with self._lock:
+            if key in self._results:
+                self.hits += 1
+                return self._results[key]
+            self.misses += 1
+
+        def run_and_remember():
+            result = func()
+            if remember is None or remember(result):
+                with self._lock:
+                    self._results[key] = result
+            return result
+
+        return self._coalescer.run(key, run_and_remember)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._results), "hits": self.hits, "misses": self.misses,
+                    "coalesced": self._coalescer.coalesced}
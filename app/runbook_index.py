@@ -0,0 +1,137 @@
+import json
+import logging
+import math
+import mmap
+import os
+import re
+from array import array
+from collections import Counter
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9_]+")
+
+DOCS_FILE = "docs.json"
+LEXICON_FILE = "lexicon.json"
+POSTINGS_FILE = "postings.bin"
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def index_query_text(keyword):
+    # Splunk field dicts are searched by their values, not their field names
+    if isinstance(keyword, dict):
+        return " ".join(str(value) for value in keyword.values() if value)
+    return str(keyword)
+
+
+def load_indexed_pages(index_dir):
+    try:
+        with open(os.path.join(index_dir, DOCS_FILE), "r") as f:
+            return json.load(f)["pages"]
+    except FileNotFoundError:
+        return []
+
+
+def write_runbook_index(index_dir, pages):
+    # pages: dicts with id, version, title, snippet, url and "terms" (term -> frequency)
+    postings_by_term = {}
+    for doc_idx, page in enumerate(pages):
+        for term, frequency in page["terms"].items():
+            postings_by_term.setdefault(term, []).append((doc_idx, frequency))
+
+    postings = array("I")
+    lexicon = {}
+    for term in sorted(postings_by_term):
+        lexicon[term] = [len(postings) // 2, len(postings_by_term[term])]
+        for doc_idx, frequency in postings_by_term[term]:
+            postings.append(doc_idx)
+            postings.append(frequency)
+
+    os.makedirs(index_dir, exist_ok=True)
+    _replace_file(os.path.join(index_dir, POSTINGS_FILE), "wb", postings.tofile)
+    _replace_file(os.path.join(index_dir, LEXICON_FILE), "w", lambda f: json.dump(lexicon, f))
+    _replace_file(os.path.join(index_dir, DOCS_FILE), "w", lambda f: json.dump({"pages": pages}, f))
+
+
+def _replace_file(path, mode, write):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, mode) as f:
+        write(f)
+    os.replace(tmp_path, path)
+
+
+def sync_runbook_index(index_dir, page_versions, fetch_page, strip_text):
+    # page_versions: iterable of (page_id, version) for every page in the space.
+    # fetch_page(page_id) returns (page dict, storage html); only new or changed pages are fetched.
+    existing = {page["id"]: page for page in load_indexed_pages(index_dir)}
+    pages = []
+    fetched = 0
+    for page_id, version in page_versions:
+        page = existing.get(page_id)
+        if page is None or page["version"] != version:
+            page, body_html = fetch_page(page_id)
+            text = strip_text(body_html)
+            page = dict(page, terms=dict(Counter(tokenize(f"{page['title']} {text}"))))
+            fetched += 1
+        pages.append(page)
+
+    removed = len(set(existing) - {page["id"] for page in pages})
+    write_runbook_index(index_dir, pages)
+    logging.info("Runbook index synced: %d pages, %d fetched, %d removed", len(pages), fetched, removed)
+    return {"pages": len(pages), "fetched": fetched, "removed": removed}
+
+
+class RunbookIndex:
+    # Read-only BM25 index; postings are (doc index, term frequency) uint32 pairs read straight from an mmap
+
+    def __init__(self, index_dir):
+        with open(os.path.join(index_dir, DOCS_FILE), "r") as f:
+            self.pages = json.load(f)["pages"]
+        with open(os.path.join(index_dir, LEXICON_FILE), "r") as f:
+            self.lexicon = json.load(f)
+
+        self.doc_lengths = array("I", (sum(page["terms"].values()) for page in self.pages))
+        self.average_length = (sum(self.doc_lengths) / len(self.doc_lengths)) if self.pages else 0.0
+        for page in self.pages:
+            del page["terms"]  # only needed for syncing
+
+        self._file = open(os.path.join(index_dir, POSTINGS_FILE), "rb")
+        if os.fstat(self._file.fileno()).st_size:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.postings = memoryview(self._mmap).cast("I")
+        else:
+            self._mmap = None
+            self.postings = memoryview(array("I"))
+
+    @classmethod
+    def load(cls, index_dir):
+        if not os.path.exists(os.path.join(index_dir, DOCS_FILE)):
+            return None
+        return cls(index_dir)
+
+    def search(self, query, top_k=3):
+        scores = {}
+        total_docs = len(self.pages)
+        for term in set(tokenize(query)):
+            entry = self.lexicon.get(term)
+            if entry is None:
+                continue
+            start, count = entry
+            idf = math.log(1 + (total_docs - count + 0.5) / (count + 0.5))
+            for i in range(start * 2, (start + count) * 2, 2):
+                doc_idx, frequency = self.postings[i], self.postings[i + 1]
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths[doc_idx] / self.average_length)
+                scores[doc_idx] = scores.get(doc_idx, 0.0) + idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+        return [self.pages[doc_idx] for doc_idx, _ in ranked]
+
+    def close(self):
+        self.postings.release()
+        if self._mmap is not None:
+            self._mmap.close()
+        self._file.close()
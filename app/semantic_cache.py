@@ -0,0 +1,182 @@
+import re
+import threading
+import time
+import zlib
+
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+# Error codes (JSON_SYNTAX_ERROR) and correlation ids (err001) name one specific incident
+IDENTIFIER_PATTERN = re.compile(r"\b(?:[a-z][a-z0-9]*(?:_[a-z0-9]+)+|[a-z]+\d+)\b")
+# Words that say nothing about which incident a question is about
+STOP_WORDS = frozenset("a an and are at can do does fix for from getting guide happened how i in is it me my of on "
+                       "please resolution resolve seeing the this to was what when why with".split())
+# Parts of an error code that do not tell one error from another ("JSON_SYNTAX_ERROR" is described by "json")
+GENERIC_ERROR_WORDS = frozenset("error errors exception fail failed failure".split())
+
+
+def question_features(question, ngram=3):
+    # Word tokens plus character n-grams of each word, so "json_syntax_error", "JSON syntax error"
+    # and "parser JSON error" share most of their features
+    text = question.lower()
+    words = [word for word in TOKEN_PATTERN.findall(text.replace("_", " ")) if word not in STOP_WORDS]
+    features = [f"w:{word}" for word in words]
+    for word in words:
+        padded = f" {word} "
+        features.extend(f"c:{padded[i:i + ngram]}" for i in range(max(len(padded) - ngram + 1, 1)))
+    return features
+
+
+def question_incident(question, keyword_extractor=None):
+    # What a question is about: its services, its error codes and correlation ids, and its words.
+    # Services come from the keyword extractor's vocabulary, so "MandateService" and "mandate" agree.
+    text = question.lower()
+    identifiers = set(IDENTIFIER_PATTERN.findall(text))
+    services = frozenset()
+    if keyword_extractor is not None:
+        keywords, _ = keyword_extractor.extract(question)
+        services = frozenset(service.lower() for service in keywords["services"])
+        identifiers.update(value.lower() for value in keywords["errors"] + keywords["correlation_id"])
+    words = frozenset(TOKEN_PATTERN.findall(text.replace("_", " ")))
+    return {"services": services, "identifiers": frozenset(identifiers), "words": words}
+
+
+def _names_identifiers(incident, other):
+    # Every error code or id of incident is named by other or, when other names none, described in its words
+    missing = incident["identifiers"] - other["identifiers"]
+    if missing and other["identifiers"]:
+        return False
+    for identifier in missing:
+        parts = set(TOKEN_PATTERN.findall(identifier.replace("_", " "))) - GENERIC_ERROR_WORDS
+        if not parts or not parts & other["words"]:
+            return False
+    return True
+
+
+def same_incident(incident, other):
+    return (incident["services"] == other["services"] and _names_identifiers(incident, other)
+            and _names_identifiers(other, incident))
+
+
+class SemanticCache:
+    # Answers keyed by hashed n-gram vectors of the question. All vectors live in one preallocated
+    # float32 matrix, so a lookup is a single matrix-vector product. Entries expire after ttl seconds
+    # and the least recently used entry is evicted when the matrix is full or the stored answers
+    # would push the cache past max_memory_mb. An entry only answers a question about the same
+    # services and error codes, however similar the wording.
+
+    def __init__(self, threshold=0.75, ttl=300, max_entries=2048, dimensions=2048, max_memory_mb=32,
+                 keyword_extractor=None):
+        self.threshold = threshold
+        self.keyword_extractor = keyword_extractor
+        self.ttl = ttl
+        self.dimensions = dimensions
+        self.max_bytes = int(max_memory_mb * 1024 * 1024)
+        # Half of the memory budget goes to the vector matrix, the rest to the stored answers
+        matrix_row_bytes = dimensions * np.dtype(np.float32).itemsize
+        self.capacity = max(1, min(max_entries, self.max_bytes // (2 * matrix_row_bytes)))
+        self._vectors = np.zeros((self.capacity, dimensions), dtype=np.float32)
+        self._created = np.full(self.capacity, -np.inf)
+        self._last_used = np.full(self.capacity, -np.inf)
+        self._entries = [None] * self.capacity
+        self._answer_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.rejected = 0
+        self.evictions = 0
+
+    def embed(self, question):
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        features = question_features(question)
+        if not features:
+            return vector
+        buckets = np.fromiter((zlib.crc32(feature.encode("utf-8")) for feature in features), dtype=np.uint32,
+                              count=len(features))
+        # Whole words count more than their n-grams; the hash's top bit picks the sign
+        weights = np.where([feature.startswith("w:") for feature in features], 2.0, 1.0).astype(np.float32)
+        np.add.at(vector, buckets % self.dimensions, np.where(buckets & 0x80000000, -weights, weights))
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def get(self, question):
+        # Returns {"answer", "question", "similarity"} for the most similar live question, or None
+        vector = self.embed(question)
+        incident = question_incident(question, self.keyword_extractor)
+        now = time.monotonic()
+        with self._lock:
+            similarities = self._vectors @ vector
+            similarities[self._created <= now - self.ttl] = -1.0
+            for slot in np.argsort(similarities)[::-1][:5]:
+                if similarities[slot] < self.threshold:
+                    break
+                entry = self._entries[slot]
+                # Near-identical wording about a different service, error code or correlation id is a
+                # different incident
+                if not same_incident(incident, entry["incident"]):
+                    self.rejected += 1
+                    continue
+                self._last_used[slot] = now
+                self.hits += 1
+                return {"answer": entry["answer"], "question": entry["question"],
+                        "similarity": round(float(similarities[slot]), 3)}
+            self.misses += 1
+            return None
+
+    def put(self, question, answer):
+        vector = self.embed(question)
+        if not vector.any():
+            return
+        answer_bytes = len(answer.encode("utf-8"))
+        if answer_bytes > self.max_bytes - self._vectors.nbytes:
+            return
+        now = time.monotonic()
+        with self._lock:
+            # Asking the same question again refreshes its entry instead of adding a copy
+            duplicates = np.flatnonzero(self._vectors @ vector >= 0.999)
+            slot = int(duplicates[0]) if len(duplicates) else self._free_slot(now)
+            self._clear(slot)
+            while self._answer_bytes + answer_bytes + self._vectors.nbytes > self.max_bytes and self._evict_lru():
+                pass
+            self._vectors[slot] = vector
+            self._created[slot] = now
+            self._last_used[slot] = now
+            self._entries[slot] = {"question": question, "answer": answer, "bytes": answer_bytes,
+                                   "incident": question_incident(question, self.keyword_extractor)}
+            self._answer_bytes += answer_bytes
+
+    def _free_slot(self, now):
+        expired = np.flatnonzero(self._created <= now - self.ttl)
+        if len(expired):
+            slot = int(expired[0])
+            self._clear(slot)
+            return slot
+        slot = int(np.argmin(self._last_used))
+        self._clear(slot)
+        self.evictions += 1
+        return slot
+
+    def _evict_lru(self):
+        live = np.flatnonzero(np.isfinite(self._created))
+        if not len(live):
+            return False
+        self._clear(int(live[np.argmin(self._last_used[live])]))
+        self.evictions += 1
+        return True
+
+    def _clear(self, slot):
+        entry = self._entries[slot]
+        if entry is not None:
+            self._answer_bytes -= entry["bytes"]
+        self._entries[slot] = None
+        self._vectors[slot] = 0.0
+        self._created[slot] = -np.inf
+        self._last_used[slot] = -np.inf
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            return {"entries": int((self._created > now - self.ttl).sum()), "capacity": self.capacity,
+                    "hits": self.hits, "misses": self.misses, "rejected": self.rejected,
+                    "evictions": self.evictions,
+                    "memory_bytes": self._vectors.nbytes + self._answer_bytes}
@@ -0,0 +1,291 @@
+import html
+import re
+
+# One token per CDATA section, comment, tag or run of text; everything is consumed left to right once.
+# Attribute values are skipped as quoted strings, so a ">" inside one does not end the tag.
+STORAGE_TOKEN_PATTERN = re.compile(
+    r"(?P<text>[^<]+)"
+    r"|<(?P<closing>/?)(?P<tag>[A-Za-z][\w:.-]*)"
+    r"(?P<attributes>[^>\"']*(?:(?:\"[^\"]*\"|'[^']*')[^>\"']*)*)>"
+    r"|<!\[CDATA\[(?P<cdata>.*?)\]\]>"
+    r"|<!--.*?-->",
+    re.S,
+)
+# Heading start tags and closing tags, found without parsing the rest of the page
+HEADING_START_PATTERN = re.compile(r"<h([1-6])(?=[\s/>])[^>]*>", re.I)
+HEADING_END_PATTERN = re.compile(r"</h[1-6]\s*>", re.I)
+TAG_PATTERN = re.compile(r"<[^>]*>")
+# Appended to a "<" that starts no complete token to test whether the next chunk could complete it
+TOKEN_CLOSERS = (">", "\">", "'>", "]]>", "-->")
+
+HEADING_TAGS = {"h1": 1, "h2": 2, "h3": 3, "h4": 4, "h5": 5, "h6": 6}
+BLOCK_TAGS = {"p", "div", "blockquote", "hr", "ac:task", "ac:rich-text-body", "ac:structured-macro"}
+CELL_TAGS = {"td", "th"}
+# Macro parameters, placeholders and images carry no readable text
+IGNORED_TAGS = {"ac:parameter", "ac:placeholder", "ac:image", "style", "script", "ri:attachment"}
+CODE_TAGS = {"pre", "ac:plain-text-body"}
+# Tags whose start or end changes the output; every other one (strong, span, tbody, </td>, <tr>, ...)
+# is skipped without a method call
+START_TAGS = set(HEADING_TAGS) | BLOCK_TAGS | CELL_TAGS | IGNORED_TAGS | CODE_TAGS | {"ol", "ul", "li", "br", "table"}
+END_TAGS = set(HEADING_TAGS) | BLOCK_TAGS | IGNORED_TAGS | CODE_TAGS | {"ol", "ul", "li", "tr", "table"}
+
+DEFAULT_SECTION_NAMES = ("Resolution", "Steps")
+
+
+class StorageFormatParser:
+    # Streaming, single-pass reader for Confluence storage format (XHTML plus ac:/ri: macros).
+    # feed() can be called with arbitrary chunks; close() returns the page as sections:
+    # [{"heading": str or None, "level": int, "blocks": [str, ...]}, ...] where a block is a
+    # paragraph, a whole (numbered) list, a table or a fenced code block.
+
+    def __init__(self):
+        self.sections = [{"heading": None, "level": 0, "blocks": []}]
+        self._buffer = ""
+        self._line = []
+        self._heading = None
+        self._lists = []
+        self._list_lines = []
+        self._new_item = False
+        self._table_depth = 0
+        self._table_lines = []
+        self._code = None
+        self._ignored_depth = 0
+
+    def feed(self, chunk):
+        data = self._buffer + chunk
+        self._buffer = data[self._consume(data):]
+
+    def close(self):
+        if self._buffer:
+            self._consume(self._buffer, final=True)
+            self._buffer = ""
+        self._end_list_item()
+        self._flush_list()
+        self._flush_line()
+        return [section for section in self.sections if section["heading"] or section["blocks"]]
+
+    def _consume(self, data, final=False):
+        # Handles every complete token and returns where the unconsumed rest starts: a tag, comment,
+        # CDATA section or character reference that may continue in the next chunk
+        position = 0
+        end_of_data = len(data)
+        for match in STORAGE_TOKEN_PATTERN.finditer(data):
+            if match.start() != position and not final and _continues_in_next_chunk(data[position:]):
+                return position  # Anything else that failed to match was a stray "<", which is dropped
+            position = match.end()
+            text, closing, tag, attributes, cdata = match.groups()
+            if text:
+                if position == end_of_data and not final:
+                    # Hold back a character reference cut off by the end of the chunk
+                    start = text.rfind("&")
+                    if start != -1 and ";" not in text[start:] and len(text) - start <= 32:
+                        self._handle_text(text[:start])
+                        return match.start() + start
+                self._handle_text(text)
+            elif tag:
+                tag = tag.lower()
+                if closing:
+                    if tag in END_TAGS:
+                        self._end_tag(tag)
+                else:
+                    if tag in START_TAGS:
+                        self._start_tag(tag)
+                    if tag in END_TAGS and attributes.endswith("/"):
+                        self._end_tag(tag)
+            elif cdata:
+                self._handle_text(cdata, raw=True)
+        if position != end_of_data and not final and _continues_in_next_chunk(data[position:]):
+            return position
+        return end_of_data
+
+    def _start_tag(self, tag):
+        if self._ignored_depth or tag in IGNORED_TAGS:
+            self._ignored_depth += tag in IGNORED_TAGS
+            return
+        if tag in CODE_TAGS:
+            self._end_list_item()
+            self._code = []
+        elif tag in HEADING_TAGS:
+            self._end_list_item()
+            self._flush_list()
+            self._flush_line()
+            self._heading = [HEADING_TAGS[tag], []]
+        elif tag in ("ol", "ul"):
+            self._end_list_item()
+            self._lists.append([tag, 0])
+        elif tag == "li":
+            self._end_list_item()
+            if self._lists:
+                self._lists[-1][1] += 1
+                self._new_item = True
+        elif tag == "br":
+            self._line.append("\n")
+        elif tag == "table":
+            self._end_list_item()
+            self._table_depth += 1
+        elif tag in CELL_TAGS:
+            if self._line:
+                self._line.append(" | ")
+        elif tag in BLOCK_TAGS and not self._lists and not self._table_depth:
+            self._flush_line()
+
+    def _end_tag(self, tag):
+        if self._ignored_depth:
+            self._ignored_depth -= tag in IGNORED_TAGS
+            return
+        if tag in CODE_TAGS and self._code is not None:
+            code = "".join(self._code).strip("\n")
+            self._code = None
+            if code.strip():
+                self._add_block(f"```\n{code}\n```")
+        elif tag in HEADING_TAGS and self._heading is not None:
+            level, parts = self._heading
+            self._heading = None
+            self.sections.append({"heading": _collapse("".join(parts)), "level": level, "blocks": []})
+        elif tag in ("ol", "ul") and self._lists:
+            self._end_list_item()
+            self._lists.pop()
+            if not self._lists:
+                self._flush_list()
+        elif tag == "li":
+            self._end_list_item()
+        elif tag == "tr" and self._table_depth:
+            row = _collapse("".join(self._line))
+            self._line = []
+            if row:
+                self._table_lines.append(row)
+        elif tag == "table" and self._table_depth:
+            self._table_depth -= 1
+            if not self._table_depth and self._table_lines:
+                block = "\n".join(self._table_lines)
+                self._table_lines = []
+                self._add_block(block)
+        elif tag in BLOCK_TAGS and not self._lists and not self._table_depth:
+            self._flush_line()
+
+    def _handle_text(self, text, raw=False):
+        if self._ignored_depth or not text:
+            return
+        if not raw and "&" in text:
+            text = html.unescape(text)
+        if self._code is not None:
+            self._code.append(text)
+        elif self._heading is not None:
+            self._heading[1].append(text)
+        elif raw:
+            self._line.append(text)
+        elif text.strip() or self._line:
+            self._line.append(text)
+
+    def _end_list_item(self):
+        text = _collapse("".join(self._line))
+        self._line = []
+        if not text:
+            return
+        if not self._lists:
+            self._add_block(text)
+            return
+        kind, number = self._lists[-1]
+        indent = "  " * (len(self._lists) - 1)
+        if self._new_item:
+            marker = f"{number}." if kind == "ol" else "-"
+            self._list_lines.append(f"{indent}{marker} {text}")
+            self._new_item = False
+        else:
+            # Text of the same item continuing after a nested block
+            self._list_lines.append(f"{indent}   {text}")
+
+    def _flush_list(self):
+        if self._list_lines:
+            block = "\n".join(self._list_lines)
+            self._list_lines = []
+            self._add_block(block)
+
+    def _flush_line(self):
+        text = _collapse("".join(self._line))
+        self._line = []
+        if text:
+            self._add_block(text)
+
+    def _add_block(self, block):
+        if self._lists:
+            self._list_lines.append(block)
+        else:
+            self.sections[-1]["blocks"].append(block)
+
+
+def _continues_in_next_chunk(rest):
+    # rest starts with a "<" that opens no complete token. It may be the start of one cut off by the
+    # end of the chunk ("<ac:link", "<a title=\"x >", "<![CDATA[..."), or a stray "<" in the text.
+    if len(rest) < len("<![CDATA[") and ">" not in rest:
+        return True
+    return any(STORAGE_TOKEN_PATTERN.match(rest + closer) for closer in TOKEN_CLOSERS)
+
+
+def _collapse(text):
+    # Whitespace inside a block collapses to single spaces; explicit <br/> line breaks survive
+    if "\n" not in text:
+        return " ".join(text.split())
+    return "\n".join(" ".join(line.split()) for line in text.split("\n")).strip()
+
+
+def parse_storage_format(body_html, chunk_size=65536):
+    parser = StorageFormatParser()
+    for start in range(0, len(body_html), chunk_size):
+        parser.feed(body_html[start:start + chunk_size])
+    return parser.close()
+
+
+def extract_sections(sections, names=DEFAULT_SECTION_NAMES):
+    # Sections whose heading starts with one of names ("Resolution", "3. Steps to resolve"),
+    # together with their subsections
+    pattern = re.compile(r"^[\W\d_]*(?:" + "|".join(re.escape(name) for name in names) + r")\b", re.I)
+    selected = []
+    matched_level = None
+    for section in sections:
+        if matched_level is not None and section["heading"] is not None and section["level"] > matched_level:
+            selected.append(section)
+            continue
+        matched_level = None
+        if section["heading"] and pattern.match(section["heading"]):
+            matched_level = section["level"]
+            selected.append(section)
+    return selected
+
+
+def parse_named_sections(body_html, names=DEFAULT_SECTION_NAMES):
+    # extract_sections(parse_storage_format(body_html), names) or, when nothing matches, every section; the
+    # headings are found with a regex first, so only the sections that are kept go through the parser
+    spans = [(section["start"], section["end"]) for section in extract_sections(_heading_spans(body_html), names)]
+    if spans:
+        selected = extract_sections(parse_storage_format("".join(body_html[start:end] for start, end in spans)), names)
+        if selected:
+            return selected
+    sections = parse_storage_format(body_html)
+    return extract_sections(sections, names) or sections
+
+
+def _heading_spans(body_html):
+    # One {"heading", "level", "start", "end"} per heading, covering the page up to the next heading
+    spans = []
+    for match in HEADING_START_PATTERN.finditer(body_html):
+        if spans:
+            spans[-1]["end"] = match.start()
+        closing = HEADING_END_PATTERN.search(body_html, match.end())
+        heading = body_html[match.end():closing.start() if closing else match.end()]
+        heading = _collapse(html.unescape(TAG_PATTERN.sub("", heading)))
+        spans.append({"heading": heading, "level": int(match.group(1)), "start": match.start(),
+                      "end": len(body_html)})
+    return spans
+
+
+def render_sections(sections):
+    # Blocks are separated by blank lines; a heading stays attached to the block that follows it
+    parts = []
+    for section in sections:
+        blocks = list(section["blocks"])
+        if section["heading"]:
+            heading = f"{'#' * section['level']} {section['heading']}"
+            blocks = [f"{heading}\n{blocks[0]}"] + blocks[1:] if blocks else [heading]
+        parts.extend(blocks)
+    return "\n\n".join(parts)
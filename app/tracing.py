@@ -0,0 +1,247 @@
+import bisect
+import contextlib
+import contextvars
+import json
+import logging
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+METRIC_PREFIX = "observability_monkey"
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+trace_logger = logging.getLogger("query_app.trace")
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Histogram:
+    # Cumulative-bucket histogram per label value, rendered in the Prometheus text format
+
+    def __init__(self, name, help_text, label, buckets=DURATION_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_value, value):
+        with self._lock:
+            series = self._series.setdefault(label_value, {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0})
+            position = bisect.bisect_left(self.buckets, value)
+            if position < len(self.buckets):
+                series["counts"][position] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label_value, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series["counts"]):
+                    cumulative += count
+                    lines.append(f'{self.name}_bucket{{{self.label}="{label_value}",le="{bound}"}} {cumulative}')
+                lines.append(f'{self.name}_bucket{{{self.label}="{label_value}",le="+Inf"}} {series["count"]}')
+                lines.append(f'{self.name}_sum{{{self.label}="{label_value}"}} {series["sum"]:.6f}')
+                lines.append(f'{self.name}_count{{{self.label}="{label_value}"}} {series["count"]}')
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help_text, label):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, label_value, amount=1):
+        with self._lock:
+            self._values[label_value] = self._values.get(label_value, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label_value, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{{{self.label}="{label_value}"}} {value}')
+        return lines
+
+
+stage_duration = Histogram(f"{METRIC_PREFIX}_stage_duration_seconds", "Duration of query pipeline stages.", "stage")
+request_duration = Histogram(f"{METRIC_PREFIX}_request_duration_seconds", "End-to-end query duration.", "outcome")
+payload_bytes = Counter(f"{METRIC_PREFIX}_payload_bytes_total", "Bytes sent to or received from each stage.", "stage")
+llm_tokens = Counter(f"{METRIC_PREFIX}_llm_tokens_total", "OpenAI tokens used, by kind.", "kind")
+breaker_trips = Counter(f"{METRIC_PREFIX}_circuit_breaker_trips_total", "Times a backend circuit opened.", "backend")
+hedged_requests = Counter(f"{METRIC_PREFIX}_hedged_requests_total",
+                          "Duplicate requests sent for slow calls, and whether the duplicate won.", "outcome")
+degraded_answers = Counter(f"{METRIC_PREFIX}_degraded_answers_total",
+                           "Answers given without a backend, from cached or local data.", "backend")
+# Fast-path hit rate is extractions{method="fast_path"} over all extractions; the time it saves is the fast-path
+# count times the average LLM extraction time, minus the fast path's own time
+keyword_extractions = Counter(f"{METRIC_PREFIX}_keyword_extractions_total",
+                              "Keyword extractions, by method (fast_path or llm).", "method")
+keyword_extraction_seconds = Counter(f"{METRIC_PREFIX}_keyword_extraction_seconds_total",
+                                     "Time spent extracting keywords, by method.", "method")
+METRICS = [stage_duration, request_duration, payload_bytes, llm_tokens, breaker_trips, hedged_requests,
+           degraded_answers, keyword_extractions, keyword_extraction_seconds]
+
+tracing_settings = {"enabled": True, "log_spans": True}
+
+
+def configure_tracing(settings):
+    tracing_settings.update({key: value for key, value in (settings or {}).items() if key in tracing_settings})
+
+
+class Span:
+    __slots__ = ("name", "started", "duration", "attributes")
+
+    def __init__(self, name, attributes):
+        self.name = name
+        self.started = time.perf_counter()
+        self.duration = None
+        self.attributes = attributes
+
+    def set(self, key, value):
+        self.attributes[key] = value
+
+    def add(self, key, amount):
+        self.attributes[key] = self.attributes.get(key, 0) + amount
+
+
+class Trace:
+    def __init__(self, name):
+        self.trace_id = uuid.uuid4().hex
+        self.name = name
+        self.started = time.perf_counter()
+        self.attributes = {}
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add_span(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+    def as_dict(self, duration):
+        with self._lock:
+            spans = [{"name": span.name,
+                      "start_ms": round((span.started - self.started) * 1000, 2),
+                      "duration_ms": round(span.duration * 1000, 2),
+                      **span.attributes} for span in sorted(self.spans, key=lambda span: span.started)]
+        return {"trace_id": self.trace_id, "name": self.name, "duration_ms": round(duration * 1000, 2),
+                **self.attributes, "spans": spans}
+
+
+def _reset(variable, token):
+    # A generator closed from another context cannot reset its token; the value dies with that context
+    try:
+        variable.reset(token)
+    except ValueError:
+        pass
+
+
+@contextlib.contextmanager
+def trace(name):
+    # Root of a request: collects the spans opened beneath it and logs them as one JSON line on exit
+    if not tracing_settings["enabled"] or _current_trace.get() is not None:
+        yield _current_trace.get() or Trace(name)
+        return
+    current = Trace(name)
+    token = _current_trace.set(current)
+    try:
+        yield current
+    finally:
+        duration = time.perf_counter() - current.started
+        _reset(_current_trace, token)
+        request_duration.observe(current.attributes.get("outcome", "error"), duration)
+        if tracing_settings["log_spans"]:
+            trace_logger.info(json.dumps(current.as_dict(duration), default=str))
+
+
+@contextlib.contextmanager
+def span(name, **attributes):
+    # Times one stage of the current request; works without a trace too, feeding only the histogram
+    current = Span(name, attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except Exception as e:
+        current.set("error", type(e).__name__)
+        raise
+    finally:
+        current.duration = time.perf_counter() - current.started
+        _reset(_current_span, token)
+        if tracing_settings["enabled"]:
+            stage_duration.observe(name, current.duration)
+            parent = _current_trace.get()
+            if parent is not None:
+                parent.add_span(current)
+
+
+def set_attribute(key, value):
+    current = _current_span.get()
+    if current is not None:
+        current.set(key, value)
+
+
+def set_trace_attribute(key, value):
+    current = _current_trace.get()
+    if current is not None:
+        current.attributes[key] = value
+
+
+def record_payload(stage, size):
+    payload_bytes.inc(stage, size)
+    current = _current_span.get()
+    if current is not None:
+        current.add("bytes", size)
+
+
+def record_token_usage(usage):
+    # usage is the "usage" object of an OpenAI chat completion (None when the API leaves it out)
+    if usage is None:
+        return
+    current = _current_span.get()
+    for kind in ("prompt_tokens", "completion_tokens", "total_tokens"):
+        value = getattr(usage, kind, None) or 0
+        llm_tokens.inc(kind, value)
+        if current is not None:
+            current.add(kind, value)
+
+
+def render_metrics():
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_metrics().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_metrics_server(port, host="0.0.0.0"):
+    try:
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+    except OSError as e:
+        logging.warning(f"Could not start the metrics endpoint on port {port}: {e}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-endpoint", daemon=True).start()
+    logging.info("Serving Prometheus metrics on http://%s:%s/metrics", host, port)
+    return server
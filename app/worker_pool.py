@@ -0,0 +1,111 @@
+import concurrent.futures
+import threading
+
+
+class PoolOverloaded(Exception):
+    pass
+
+
+class QueryWorkerPool:
+    # A fixed number of worker threads plus a bounded queue in front of them. Work that would
+    # push the number of admitted jobs past max_workers + max_queue is refused up front
+    # instead of piling up, so callers can shed load (HTTP 429) rather than time out.
+
+    def __init__(self, max_workers=8, max_queue=32):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.capacity = max_workers + max_queue
+        self.admitted = 0
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.abandoned = 0
+        self._lock = threading.Lock()
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers,
+                                                               thread_name_prefix="query-worker")
+
+    def admit(self, count=1):
+        # All or nothing, so a batch is never half-accepted
+        with self._lock:
+            if self.admitted + count > self.capacity:
+                self.rejected += count
+                raise PoolOverloaded(f"{self.admitted} queries in flight, capacity is {self.capacity}")
+            self.admitted += count
+
+    def release(self, count=1):
+        with self._lock:
+            self.admitted -= count
+
+    def submit(self, func, *args, admitted=False):
+        # Callers that already reserved a slot with admit() pass admitted=True
+        if not admitted:
+            self.admit()
+        try:
+            future = self._executor.submit(self._run, func, *args)
+        except RuntimeError:
+            self.release()
+            raise
+        # A job cancelled while still queued never reaches _run, so its slot is given back here
+        future.add_done_callback(self._release_if_cancelled)
+        return future
+
+    def submit_many(self, func, items):
+        # Admits every item or none. If the executor shuts down part way through, the items not yet
+        # submitted give back their slots and the submitted ones are cancelled.
+        self.admit(len(items))
+        futures = []
+        try:
+            for item in items:
+                futures.append(self.submit(func, item, admitted=True))
+        except RuntimeError:
+            self.release(len(items) - len(futures) - 1)  # submit() released the one that failed
+            self.abandon(futures)
+            raise
+        return futures
+
+    def abandon(self, futures):
+        # For callers that stopped waiting: queued jobs are cancelled; running ones cannot be
+        # interrupted, so they are counted as abandoned until they finish and free their slot
+        for future in futures:
+            if future.cancel() or future.done():
+                continue
+            with self._lock:
+                self.timed_out += 1
+                self.abandoned += 1
+            future.add_done_callback(self._finish_abandoned)
+
+    def _release_if_cancelled(self, future):
+        if future.cancelled():
+            self.release()
+
+    def _finish_abandoned(self, future):
+        with self._lock:
+            self.abandoned -= 1
+
+    def _run(self, func, *args):
+        with self._lock:
+            self.running += 1
+        try:
+            return func(*args)
+        finally:
+            with self._lock:
+                self.running -= 1
+                self.admitted -= 1
+                self.completed += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "capacity": self.capacity,
+                "running": self.running,
+                "queued": self.admitted - self.running,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "timed_out": self.timed_out,
+                "abandoned": self.abandoned,
+            }
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
@@ -1,5 +1,10 @@
+import logging
 import sys
 import os
+import time
+
+script_started = time.perf_counter()
+
 import streamlit as st
 import atexit
 from PIL import Image
@@ -9,7 +14,9 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from scripts.start_dependencies import start_dependencies
 from scripts.stop_dependencies import stop_splunk_container
-from app.query_app import process_user_query
+from app.query_app import prepare_log_backend, process_user_query_stream, start_metrics_endpoint
+
+logger = logging.getLogger(__name__)
 
 # Set page configuration
 st.set_page_config(page_title="Observability Monkey Chat", layout="wide")
@@ -17,11 +24,18 @@ st.set_page_config(page_title="Observability Monkey Chat", layout="wide")
 # Ensure stop_dependencies is called when the app stops
 atexit.register(stop_splunk_container)
 
-# Start dependencies only once
-if "dependencies_started" not in st.session_state:
-    with st.spinner("Starting dependencies... Please wait."):
-        start_dependencies()
-    st.session_state.dependencies_started = True
+
+# Cached per server process, so reruns and new browser sessions do not repeat the Splunk checks
+@st.cache_resource(show_spinner="Starting dependencies... Please wait.")
+def start_backend():
+    started = time.perf_counter()
+    start_dependencies()
+    start_metrics_endpoint()
+    prepare_log_backend()
+    return time.perf_counter() - started
+
+
+backend_startup_seconds = start_backend()
 
 # Load and display logo in the header
 logo_path = "assets/logo.png"  # Adjust if needed
@@ -53,8 +67,16 @@ if user_input:
     with st.chat_message("user"):
         st.markdown(user_input)
 
-    # Get bot response
-    response = process_user_query(user_input)
-    st.session_state.history.append(("bot", response))
+    # Stream the bot response as it is generated, with a status line for each pipeline stage
     with st.chat_message("bot"):
-        st.markdown(response)
+        status = st.status("Working on it...")
+        response = st.write_stream(
+            process_user_query_stream(user_input, on_status=lambda label: status.update(label=label))
+        )
+        status.update(label="Done", state="complete")
+    st.session_state.history.append(("bot", response))
+
+if "startup_logged" not in st.session_state:
+    logger.info("First render after %.2fs (backend startup %.2fs)", time.perf_counter() - script_started,
+                backend_startup_seconds)
+    st.session_state.startup_logged = True
@@ -1,101 +1,184 @@
+import argparse
+import concurrent.futures
+import functools
+import gzip
 import requests
 import random
 import json
+import threading
 import time
 import re  # Fixed missing import
 from splunk_utils import create_splunk_token
+from http_pool import RateLimiter, get_session, pool_stats
 
 
-def generate_fake_logs(splunk_token, splunk_url):
+SPLUNK_LOGS = [
+    [
+        """level=INFO service=parser host=parser-01 environment=production event="Started processing file orders_2025_05_06.csv" status=started file=orders_2025_05_06.csv correlation_id=abc001""",
+        """level=INFO service=parser host=parser-01 environment=production event="File header validated successfully" file=orders_2025_05_06.csv header_row=true correlation_id=abc001""",
+        """level=INFO service=parser host=parser-01 environment=production event="Parsed 500 records" file=orders_2025_05_06.csv records_processed=500 correlation_id=abc001""",
+        """level=INFO service=parser host=parser-01 environment=production event="Completed parsing file" file=orders_2025_05_06.csv duration_ms=642 total_records=1045 status=success correlation_id=abc001""",
+        """level=INFO service=parser host=parser-02 environment=production event="Started processing file customers_2025_05_06.json" status=started file=customers_2025_05_06.json correlation_id=abc002""",
+        """level=INFO service=parser host=parser-02 environment=production event="Detected 3 customer segments in file" segments_detected=3 file=customers_2025_05_06.json correlation_id=abc002""",
+        """level=INFO service=parser host=parser-02 environment=production event="Completed parsing file" file=customers_2025_05_06.json duration_ms=480 total_records=900 status=success correlation_id=abc002""",
+        """level=INFO service=parser host=parser-03 environment=production event="Parser health check passed" uptime_minutes=1247 correlation_id=sys001""",
+        """level=INFO service=parser host=parser-01 environment=production event="No files to process in incoming directory" directory=/data/incoming correlation_id=abc003""",
+        """level=INFO service=parser host=parser-01 environment=production event="Scheduled parser job executed successfully" job_name=daily_parser_sync job_id=job123 duration_ms=122 correlation_id=sched001""",
+        """level=WARN service=parser host=parser-01 environment=production event="File contains unexpected column: 'discount_rate'" file=orders_2025_05_06.csv column=discount_rate correlation_id=abc001""",
+        """level=WARN service=parser host=parser-02 environment=production event="Missing optional field 'customer_age' in 132 records" file=customers_2025_05_06.json missing_field=customer_age correlation_id=abc002""",
+        """level=WARN service=parser host=parser-03 environment=production event="Parser memory usage exceeded threshold: 82%" memory_usage=82% threshold=80% correlation_id=sys002""",
+        """level=WARN service=parser host=parser-01 environment=production event="File size unusually large: 250MB" file=large_file.csv size_mb=250 correlation_id=abc004""",
+        """level=WARN service=parser host=parser-02 environment=production event="Retrying fetch due to slow network response" retry_count=1 file=transactions_2025_05_06.csv correlation_id=abc005""",
+        """level=WARN service=parser host=parser-01 environment=production event="High latency observed while writing to database" latency_ms=512 db_endpoint=db-prod-1 correlation_id=abc006""",
+        """level=WARN service=parser host=parser-03 environment=production event="Timezone mismatch detected in 34 rows" file=events_2025_05_06.csv correlation_id=abc007""",
+        """level=WARN service=parser host=parser-02 environment=production event="Deprecated format detected in column 'user_status'" column=user_status file=legacy_users.csv correlation_id=abc008""",
+        """level=WARN service=parser host=parser-01 environment=production event="Retry limit approaching for file download" retries_left=1 url=https://fileserver/input_1.csv correlation_id=abc009""",
+        """level=WARN service=parser host=parser-03 environment=production event="Skipped parsing of empty file" file=empty_file.csv correlation_id=abc010""",
+        """level=ERROR service=parser host=parser-02 environment=production event="Parsing failed due to malformed JSON in line 482 of file 'invoices_2025_05_06.json'. Expected closing bracket but found comma." file=invoices_2025_05_06.json line_number=482 error_code=JSON_SYNTAX_ERROR correlation_id=err001""",
+        """level=ERROR service=parser host=parser-01 environment=production event="Timeout while accessing remote file location" file_url=https://fileserver/remote.csv timeout_ms=10000 correlation_id=err002 error_code=FILE_FETCH_TIMEOUT""",
+        """level=ERROR service=parser host=parser-03 environment=production event="NullPointerException while processing record batch" exception=NullPointerException file=records_batch.csv correlation_id=err003""",
+        """level=ERROR service=parser host=parser-02 environment=production event="Database write failed due to constraint violation on 'order_id'" constraint=unique_order_id file=orders_2025_05_06.csv correlation_id=err004""",
+        """level=ERROR service=parser host=parser-01 environment=production event="Job crashed unexpectedly. Stacktrace captured." job_name=daily_parser_sync error_code=UNCAUGHT_EXCEPTION correlation_id=err005""",
+        """level=ERROR service=parser host=parser-01 environment=production event="DB Connection timed out" job_name=daily_parser_sync error_code=DB_CONNECTION_TIMEOUT correlation_id=err006""",
+        """level=INFO service=MandateService host=mandate-01 environment=production event="Started processing mandate file mandates_2025_05_06.csv" status=started file=mandates_2025_05_06.csv correlation_id=mand001""",
+        """level=INFO service=MandateService host=mandate-01 environment=production event="File header validated successfully" file=mandates_2025_05_06.csv header_row=true correlation_id=mand001""",
+        """level=INFO service=MandateService host=mandate-01 environment=production event="Parsed 1200 records" file=mandates_2025_05_06.csv records_processed=1200 correlation_id=mand001""",
+        """level=INFO service=MandateService host=mandate-01 environment=production event="Completed parsing mandate file" file=mandates_2025_05_06.csv duration_ms=753 total_records=1500 status=success correlation_id=mand001""",
+        """level=INFO service=MandateService host=mandate-02 environment=production event="Started processing mandate file mandates_2025_05_06.xml" status=started file=mandates_2025_05_06.xml correlation_id=mand002""",
+        """level=INFO service=MandateService host=mandate-03 environment=production event="Scheduled mandate file sync executed successfully" job_name=mandate_file_sync job_id=job456 duration_ms=320 correlation_id=sched002""",
+        """level=WARN service=MandateService host=mandate-01 environment=production event="File contains unexpected column: 'bank_code'" file=mandates_2025_05_06.csv column=bank_code correlation_id=mand001""",
+        """level=ERROR service=MandateService host=mandate-02 environment=production event="Parsing failed due to invalid XML format in line 312 of file 'mandates_2025_05_06.xml'. Expected closing tag but found '<'." file=mandates_2025_05_06.xml line_number=312 error_code=XML_SYNTAX_ERROR correlation_id=err001""",
+        """level=ERROR service=MandateService host=mandate-03 environment=production event="Database write failed due to constraint violation on 'mandate_id'" constraint=unique_mandate_id file=mandates_2025_05_06.csv correlation_id=err002"""
+    ]
+]
+
+
+def build_log_event(raw_log):
+    level_match = re.search(r'level=(\w+)', raw_log)
+    log_level = level_match.group(1) if level_match else "UNKNOWN"
+
+    return {
+        "event": {
+            "level": log_level,
+            "error": raw_log,
+            "logger": f"com.example.module{random.randint(1, 5)}",
+            "thread": f"Thread-{random.randint(1, 20)}",
+            "timestamp": int(time.time())
+        },
+        "sourcetype": "splunk_logs"
+    }
+
+
+def iter_fake_log_events(total_events):
+    for _ in range(total_events):
+        yield build_log_event(random.choice(random.choice(SPLUNK_LOGS)))
+
+
+def iter_batches(events, batch_size):
+    batch = []
+    for event in events:
+        batch.append(event)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def send_batch(session, splunk_url, headers, batch, use_gzip):
+    # HEC accepts several events in one request as concatenated JSON objects
+    payload = "\n".join(json.dumps(event) for event in batch).encode("utf-8")
+    if use_gzip:
+        payload = gzip.compress(payload)
+    try:
+        response = session.post(splunk_url, headers=headers, data=payload)
+        if response.status_code != 200:
+            return f"HTTP {response.status_code}: {response.text}"
+    except requests.exceptions.RequestException as e:
+        return str(e)
+    return None
+
+
+def send_events(splunk_token, splunk_url, events, batch_size=100, workers=4, events_per_second=None,
+                use_gzip=True):
     headers = {
         'Authorization': f'Splunk {splunk_token}',
         'Content-Type': 'application/json'
     }
+    if use_gzip:
+        headers['Content-Encoding'] = 'gzip'
 
-    splunk_logs = [
-        [
-            """level=INFO service=parser host=parser-01 environment=production event="Started processing file orders_2025_05_06.csv" status=started file=orders_2025_05_06.csv correlation_id=abc001""",
-            """level=INFO service=parser host=parser-01 environment=production event="File header validated successfully" file=orders_2025_05_06.csv header_row=true correlation_id=abc001""",
-            """level=INFO service=parser host=parser-01 environment=production event="Parsed 500 records" file=orders_2025_05_06.csv records_processed=500 correlation_id=abc001""",
-            """level=INFO service=parser host=parser-01 environment=production event="Completed parsing file" file=orders_2025_05_06.csv duration_ms=642 total_records=1045 status=success correlation_id=abc001""",
-            """level=INFO service=parser host=parser-02 environment=production event="Started processing file customers_2025_05_06.json" status=started file=customers_2025_05_06.json correlation_id=abc002""",
-            """level=INFO service=parser host=parser-02 environment=production event="Detected 3 customer segments in file" segments_detected=3 file=customers_2025_05_06.json correlation_id=abc002""",
-            """level=INFO service=parser host=parser-02 environment=production event="Completed parsing file" file=customers_2025_05_06.json duration_ms=480 total_records=900 status=success correlation_id=abc002""",
-            """level=INFO service=parser host=parser-03 environment=production event="Parser health check passed" uptime_minutes=1247 correlation_id=sys001""",
-            """level=INFO service=parser host=parser-01 environment=production event="No files to process in incoming directory" directory=/data/incoming correlation_id=abc003""",
-            """level=INFO service=parser host=parser-01 environment=production event="Scheduled parser job executed successfully" job_name=daily_parser_sync job_id=job123 duration_ms=122 correlation_id=sched001""",
-            """level=WARN service=parser host=parser-01 environment=production event="File contains unexpected column: 'discount_rate'" file=orders_2025_05_06.csv column=discount_rate correlation_id=abc001""",
-            """level=WARN service=parser host=parser-02 environment=production event="Missing optional field 'customer_age' in 132 records" file=customers_2025_05_06.json missing_field=customer_age correlation_id=abc002""",
-            """level=WARN service=parser host=parser-03 environment=production event="Parser memory usage exceeded threshold: 82%" memory_usage=82% threshold=80% correlation_id=sys002""",
-            """level=WARN service=parser host=parser-01 environment=production event="File size unusually large: 250MB" file=large_file.csv size_mb=250 correlation_id=abc004""",
-            """level=WARN service=parser host=parser-02 environment=production event="Retrying fetch due to slow network response" retry_count=1 file=transactions_2025_05_06.csv correlation_id=abc005""",
-            """level=WARN service=parser host=parser-01 environment=production event="High latency observed while writing to database" latency_ms=512 db_endpoint=db-prod-1 correlation_id=abc006""",
-            """level=WARN service=parser host=parser-03 environment=production event="Timezone mismatch detected in 34 rows" file=events_2025_05_06.csv correlation_id=abc007""",
-            """level=WARN service=parser host=parser-02 environment=production event="Deprecated format detected in column 'user_status'" column=user_status file=legacy_users.csv correlation_id=abc008""",
-            """level=WARN service=parser host=parser-01 environment=production event="Retry limit approaching for file download" retries_left=1 url=https://fileserver/input_1.csv correlation_id=abc009""",
-            """level=WARN service=parser host=parser-03 environment=production event="Skipped parsing of empty file" file=empty_file.csv correlation_id=abc010""",
-            """level=ERROR service=parser host=parser-02 environment=production event="Parsing failed due to malformed JSON in line 482 of file 'invoices_2025_05_06.json'. Expected closing bracket but found comma." file=invoices_2025_05_06.json line_number=482 error_code=JSON_SYNTAX_ERROR correlation_id=err001""",
-            """level=ERROR service=parser host=parser-01 environment=production event="Timeout while accessing remote file location" file_url=https://fileserver/remote.csv timeout_ms=10000 correlation_id=err002 error_code=FILE_FETCH_TIMEOUT""",
-            """level=ERROR service=parser host=parser-03 environment=production event="NullPointerException while processing record batch" exception=NullPointerException file=records_batch.csv correlation_id=err003""",
-            """level=ERROR service=parser host=parser-02 environment=production event="Database write failed due to constraint violation on 'order_id'" constraint=unique_order_id file=orders_2025_05_06.csv correlation_id=err004""",
-            """level=ERROR service=parser host=parser-01 environment=production event="Job crashed unexpectedly. Stacktrace captured." job_name=daily_parser_sync error_code=UNCAUGHT_EXCEPTION correlation_id=err005""",
-            """level=ERROR service=parser host=parser-01 environment=production event="DB Connection timed out" job_name=daily_parser_sync error_code=DB_CONNECTION_TIMEOUT correlation_id=err006""",
-            """level=INFO service=MandateService host=mandate-01 environment=production event="Started processing mandate file mandates_2025_05_06.csv" status=started file=mandates_2025_05_06.csv correlation_id=mand001""",
-            """level=INFO service=MandateService host=mandate-01 environment=production event="File header validated successfully" file=mandates_2025_05_06.csv header_row=true correlation_id=mand001""",
-            """level=INFO service=MandateService host=mandate-01 environment=production event="Parsed 1200 records" file=mandates_2025_05_06.csv records_processed=1200 correlation_id=mand001""",
-            """level=INFO service=MandateService host=mandate-01 environment=production event="Completed parsing mandate file" file=mandates_2025_05_06.csv duration_ms=753 total_records=1500 status=success correlation_id=mand001""",
-            """level=INFO service=MandateService host=mandate-02 environment=production event="Started processing mandate file mandates_2025_05_06.xml" status=started file=mandates_2025_05_06.xml correlation_id=mand002""",
-            """level=INFO service=MandateService host=mandate-03 environment=production event="Scheduled mandate file sync executed successfully" job_name=mandate_file_sync job_id=job456 duration_ms=320 correlation_id=sched002""",
-            """level=WARN service=MandateService host=mandate-01 environment=production event="File contains unexpected column: 'bank_code'" file=mandates_2025_05_06.csv column=bank_code correlation_id=mand001""",
-            """level=ERROR service=MandateService host=mandate-02 environment=production event="Parsing failed due to invalid XML format in line 312 of file 'mandates_2025_05_06.xml'. Expected closing tag but found '<'." file=mandates_2025_05_06.xml line_number=312 error_code=XML_SYNTAX_ERROR correlation_id=err001""",
-            """level=ERROR service=MandateService host=mandate-03 environment=production event="Database write failed due to constraint violation on 'mandate_id'" constraint=unique_mandate_id file=mandates_2025_05_06.csv correlation_id=err002"""
-        ]
-    ]
-    for i in range(1000):
-        raw_log = random.choice(random.choice(splunk_logs))
-        level_match = re.search(r'level=(\w+)', raw_log)
-        log_level = level_match.group(1) if level_match else "UNKNOWN"
-
-        log_event = {
-            "event": {
-                "level": log_level,
-                "error": raw_log,
-                "logger": f"com.example.module{random.randint(1, 5)}",
-                "thread": f"Thread-{random.randint(1, 20)}",
-                "timestamp": int(time.time())
-            },
-            "sourcetype": "splunk_logs"
-        }
+    # Every worker keeps its own keep-alive connection, so the pool must hold at least one per worker
+    session = get_session("hec", verify=False, pool_maxsize=workers)
+    rate_limiter = RateLimiter(events_per_second)
+    # Bound the batches waiting on workers so large runs don't build up in memory
+    in_flight = threading.BoundedSemaphore(workers * 2)
+    report = {"events_sent": 0, "events_failed": 0, "batches": 0}
+    report_lock = threading.Lock()
 
+    def worker(batch):
         try:
-            response = requests.post(
-                splunk_url,
-                headers=headers,
-                data=json.dumps(log_event),
-                verify=False,
-                timeout=10
-            )
+            rate_limiter.acquire(len(batch))
+            error = send_batch(session, splunk_url, headers, batch, use_gzip)
+            with report_lock:
+                report["batches"] += 1
+                if error:
+                    report["events_failed"] += len(batch)
+                    print(f"Failed to send batch of {len(batch)} events: {error}")
+                else:
+                    report["events_sent"] += len(batch)
+        finally:
+            in_flight.release()
+
+    def check(batch_events, future):
+        # A worker that raised never got to count its batch
+        error = future.exception()
+        if error is not None:
+            with report_lock:
+                report["batches"] += 1
+                report["events_failed"] += batch_events
+            print(f"Worker failed on a batch of {batch_events} events: {error!r}")
 
-            if response.status_code != 200:
-                print(f"Failed to send event {i}: {response.text}")
-            else:
-                print(f"[{i + 1}/1000] Event sent")
+    started = time.monotonic()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        for batch in iter_batches(events, batch_size):
+            in_flight.acquire()
+            executor.submit(worker, batch).add_done_callback(functools.partial(check, len(batch)))
+    elapsed = time.monotonic() - started
 
-        except requests.exceptions.RequestException as e:
-            print(f"Failed to send event {i}: {e}")
+    report["elapsed_seconds"] = round(elapsed, 3)
+    report["events_per_second"] = round(report["events_sent"] / elapsed, 1) if elapsed else None
+    report["connection_pool"] = pool_stats().get("hec")
+    print(f"Sent {report['events_sent']} events in {report['batches']} batches "
+          f"({report['events_failed']} failed) in {elapsed:.2f}s: {report['events_per_second']} events/sec")
+    print(f"HEC connection pool: {report['connection_pool']}")
+    return report
 
-        time.sleep(0.01)  # Slight delay to avoid burst overload
+
+def generate_fake_logs(splunk_token, splunk_url, total_events=1000, batch_size=100, workers=4,
+                       events_per_second=None, use_gzip=True):
+    return send_events(splunk_token, splunk_url, iter_fake_log_events(total_events), batch_size=batch_size,
+                       workers=workers, events_per_second=events_per_second, use_gzip=use_gzip)
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Send fake log events to the Splunk HTTP Event Collector.")
+    parser.add_argument("--events", type=int, default=1000, help="total number of events to send")
+    parser.add_argument("--batch-size", type=int, default=100, help="events per HEC request")
+    parser.add_argument("--workers", type=int, default=4, help="concurrent keep-alive connections")
+    parser.add_argument("--rate", type=float, default=None, help="target events per second (default: unlimited)")
+    parser.add_argument("--no-gzip", action="store_true", help="send uncompressed request bodies")
+    args = parser.parse_args()
+
     print("Generating fake logs for Splunk...")
     splunk_token = create_splunk_token()
     print("Splunk token created:", splunk_token)
 
     splunk_url = 'https://localhost:8088/services/collector/event'
 
-    generate_fake_logs(splunk_token, splunk_url)
+    generate_fake_logs(splunk_token, splunk_url, total_events=args.events, batch_size=args.batch_size,
+                       workers=args.workers, events_per_second=args.rate, use_gzip=not args.no_gzip)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,191 @@
+import argparse
+import itertools
+import json
+import os
+import random
+import re
+import time
+
+from generate_fake_splunk_logs import SPLUNK_LOGS, send_events
+from splunk_utils import create_splunk_token
+
+DEFAULT_SERVICES = sorted({re.search(r'service=(\w+)', line).group(1) for logs in SPLUNK_LOGS for line in logs})
+DEFAULT_ERROR_CODES = sorted({re.search(r'error_code=(\w+)', line).group(1)
+                              for logs in SPLUNK_LOGS for line in logs if 'error_code=' in line}) + [
+    "MISSING_REQUIRED_FIELD", "FILE_NOT_FOUND", "UNSUPPORTED_FILE_FORMAT",
+]
+WARNING_CODES = ["DEPRECATED_FIELD_USED", "SLOW_PARSE_WARNING", "RETRYING_DB_CONNECTION", "FIELD_TRUNCATED"]
+ERROR_EVENTS = {
+    "JSON_SYNTAX_ERROR": "Parsing failed due to malformed JSON",
+    "XML_SYNTAX_ERROR": "Parsing failed due to invalid XML format",
+    "FILE_FETCH_TIMEOUT": "Timeout while accessing remote file location",
+    "DB_CONNECTION_TIMEOUT": "DB Connection timed out",
+    "UNCAUGHT_EXCEPTION": "Job crashed unexpectedly. Stacktrace captured.",
+}
+
+DURATION_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_duration(value):
+    match = re.fullmatch(r"(\d+)([smhd])", value)
+    if not match:
+        raise argparse.ArgumentTypeError(f"invalid duration '{value}', expected e.g. 30m, 6h or 7d")
+    return int(match.group(1)) * DURATION_UNITS[match.group(2)]
+
+
+def zipf_cum_weights(count, exponent):
+    # Rank k is picked with probability proportional to 1 / k**exponent
+    return list(itertools.accumulate(1 / (rank ** exponent) for rank in range(1, count + 1)))
+
+
+class WorkloadGenerator:
+    # Emits HEC-shaped events grouped into correlation-id traces spread over a time window
+
+    def __init__(self, services=None, hosts_per_service=3, error_codes=None, error_rate=0.05, zipf_exponent=1.2,
+                 min_trace_length=2, max_trace_length=6, time_span=86400, end_time=None, seed=None):
+        self.random = random.Random(seed)
+        self.services = services or DEFAULT_SERVICES
+        self.hosts_per_service = hosts_per_service
+        self.error_codes = error_codes or DEFAULT_ERROR_CODES
+        self.error_rate = error_rate
+        self.min_trace_length = min_trace_length
+        self.max_trace_length = max_trace_length
+        self.time_span = time_span
+        self.end_time = end_time if end_time is not None else time.time()
+        self.service_weights = zipf_cum_weights(len(self.services), zipf_exponent)
+        self.error_weights = zipf_cum_weights(len(self.error_codes), zipf_exponent)
+        self.trace_counter = itertools.count(1)
+
+    def iter_events(self, total_events):
+        emitted = 0
+        while emitted < total_events:
+            for event in self.generate_trace():
+                yield event
+                emitted += 1
+                if emitted == total_events:
+                    return
+
+    def generate_trace(self):
+        rng = self.random
+        is_error = rng.random() < self.error_rate
+        trace_number = next(self.trace_counter)
+        correlation_id = f"{'err' if is_error else 'abc'}{trace_number:06d}"
+        service = rng.choices(self.services, cum_weights=self.service_weights)[0]
+        timestamp = self.end_time - rng.random() * self.time_span
+        file_name = f"batch_{trace_number:06d}.{rng.choice(['csv', 'json', 'xml'])}"
+        length = rng.randint(self.min_trace_length, self.max_trace_length)
+
+        events = [self.build_event(timestamp, "INFO", service, correlation_id,
+                                   f"Started processing file {file_name}", file=file_name, status="started")]
+        for _ in range(length - 2):
+            timestamp += rng.uniform(0.01, 2.0)
+            if rng.random() < 0.2:
+                events.append(self.build_event(timestamp, "WARN", service, correlation_id,
+                                               "Recoverable issue while processing file", file=file_name,
+                                               warning_code=rng.choice(WARNING_CODES)))
+            else:
+                records = rng.randint(100, 5000)
+                events.append(self.build_event(timestamp, "INFO", service, correlation_id,
+                                               f"Parsed {records} records", file=file_name,
+                                               records_processed=records))
+
+        timestamp += rng.uniform(0.01, 2.0)
+        if is_error:
+            # Failures often surface in a downstream service under the same correlation id
+            if len(self.services) > 1 and rng.random() < 0.3:
+                service = rng.choice([s for s in self.services if s != service])
+            error_code = rng.choices(self.error_codes, cum_weights=self.error_weights)[0]
+            message = ERROR_EVENTS.get(error_code, f"Processing failed with {error_code}")
+            events.append(self.build_event(timestamp, "ERROR", service, correlation_id, message, file=file_name,
+                                           error_code=error_code))
+        else:
+            events.append(self.build_event(timestamp, "INFO", service, correlation_id, "Completed parsing file",
+                                           file=file_name, duration_ms=int((timestamp - events[0]["time"]) * 1000),
+                                           status="success"))
+        return events
+
+    def build_event(self, timestamp, level, service, correlation_id, message, **fields):
+        host = f"{service.lower()}-{self.random.randint(1, self.hosts_per_service):02d}"
+        extra = " ".join(f"{key}={value}" for key, value in fields.items())
+        raw_log = (f'level={level} service={service} host={host} environment=production event="{message}" '
+                   f'{extra} correlation_id={correlation_id}')
+        return {
+            "time": round(timestamp, 3),
+            "event": {
+                "level": level,
+                "error": raw_log,
+                "logger": f"com.example.module{self.random.randint(1, 5)}",
+                "thread": f"Thread-{self.random.randint(1, 20)}",
+                "timestamp": int(timestamp)
+            },
+            "sourcetype": "splunk_logs"
+        }
+
+
+def write_ndjson_segments(events, output_dir, segment_size=100000):
+    # Rolls over to a new segment-NNNNN.ndjson file every segment_size events
+    os.makedirs(output_dir, exist_ok=True)
+    segment_file = None
+    written = 0
+    try:
+        for event in events:
+            if written % segment_size == 0:
+                if segment_file:
+                    segment_file.close()
+                path = os.path.join(output_dir, f"segment-{written // segment_size:05d}.ndjson")
+                segment_file = open(path, "w")
+            segment_file.write(json.dumps(event) + "\n")
+            written += 1
+    finally:
+        if segment_file:
+            segment_file.close()
+    print(f"Wrote {written} events to {output_dir}")
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a realistic, reproducible synthetic log workload.")
+    parser.add_argument("--events", type=int, default=100000, help="total number of events")
+    parser.add_argument("--services", default=",".join(DEFAULT_SERVICES), help="comma-separated service names")
+    parser.add_argument("--hosts-per-service", type=int, default=3)
+    parser.add_argument("--error-codes", default=",".join(DEFAULT_ERROR_CODES), help="comma-separated error codes")
+    parser.add_argument("--error-rate", type=float, default=0.05, help="fraction of traces ending in an error")
+    parser.add_argument("--zipf", type=float, default=1.2, help="skew exponent for service and error popularity")
+    parser.add_argument("--min-trace-length", type=int, default=2)
+    parser.add_argument("--max-trace-length", type=int, default=6)
+    parser.add_argument("--span", type=parse_duration, default="24h", help="backfill window, e.g. 6h or 7d")
+    parser.add_argument("--end-time", type=float, default=None, help="epoch seconds of the newest event (default: now)")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="random seed; with --end-time makes the dataset fully reproducible")
+    parser.add_argument("--output", choices=["hec", "ndjson"], default="ndjson")
+    parser.add_argument("--ndjson-dir", default="data/workload", help="directory for NDJSON segments")
+    parser.add_argument("--segment-size", type=int, default=100000, help="events per NDJSON segment")
+    parser.add_argument("--batch-size", type=int, default=500, help="events per HEC request")
+    parser.add_argument("--workers", type=int, default=8, help="concurrent HEC connections")
+    parser.add_argument("--rate", type=float, default=None, help="target HEC events per second")
+    args = parser.parse_args()
+
+    generator = WorkloadGenerator(
+        services=[s for s in args.services.split(",") if s],
+        hosts_per_service=args.hosts_per_service,
+        error_codes=[c for c in args.error_codes.split(",") if c],
+        error_rate=args.error_rate,
+        zipf_exponent=args.zipf,
+        min_trace_length=max(args.min_trace_length, 2),
+        max_trace_length=max(args.max_trace_length, args.min_trace_length, 2),
+        time_span=args.span,
+        end_time=args.end_time,
+        seed=args.seed,
+    )
+    events = generator.iter_events(args.events)
+
+    if args.output == "ndjson":
+        write_ndjson_segments(events, args.ndjson_dir, args.segment_size)
+    else:
+        splunk_token = create_splunk_token()
+        send_events(splunk_token, 'https://localhost:8088/services/collector/event', events,
+                    batch_size=args.batch_size, workers=args.workers, events_per_second=args.rate)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+import os
+import threading
+import time
+
+import requests
+import yaml
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'config', 'config.yaml')
+
+DEFAULT_POOL_SETTINGS = {
+    "pool_connections": 10,
+    "pool_maxsize": 20,
+    "max_retries": 3,
+    "backoff_factor": 0.2,
+    "timeout": 30,
+}
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    # requests has no session-wide timeout, so the adapter fills in the per-host default
+    def __init__(self, timeout=None, **kwargs):
+        self.timeout = timeout
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout
+        return super().send(request, **kwargs)
+
+    def pool_stats(self):
+        total_requests = 0
+        new_connections = 0
+        for key in list(self.poolmanager.pools.keys()):
+            pool = self.poolmanager.pools.get(key)
+            if pool is None:
+                continue
+            total_requests += pool.num_requests
+            new_connections += pool.num_connections
+        return {
+            "requests": total_requests,
+            "pool_misses": new_connections,
+            "pool_hits": max(total_requests - new_connections, 0),
+        }
+
+
+def load_pool_settings(name):
+    settings = dict(DEFAULT_POOL_SETTINGS)
+    try:
+        with open(CONFIG_PATH, "r") as f:
+            pool_config = (yaml.safe_load(f) or {}).get("http_pool", {})
+    except FileNotFoundError:
+        pool_config = {}
+    settings.update({k: v for k, v in pool_config.items() if k != "hosts"})
+    settings.update(pool_config.get("hosts", {}).get(name, {}))
+    return settings
+
+
+def get_session(name, auth=None, verify=True, pool_maxsize=None):
+    # One long-lived session per backend so TCP/TLS connections are reused across queries.
+    # pool_maxsize raises the configured pool size for callers with more threads than it allows.
+    with _sessions_lock:
+        session = _sessions.get(name)
+        if session is not None:
+            return session
+
+        settings = load_pool_settings(name)
+        if pool_maxsize:
+            settings["pool_maxsize"] = max(settings["pool_maxsize"], pool_maxsize)
+        retries = Retry(
+            total=settings["max_retries"],
+            backoff_factor=settings["backoff_factor"],
+            status_forcelist=(429, 500, 502, 503, 504),
+        )
+        adapter = PooledHTTPAdapter(
+            timeout=settings["timeout"],
+            pool_connections=settings["pool_connections"],
+            pool_maxsize=settings["pool_maxsize"],
+            max_retries=retries,
+        )
+        session = requests.Session()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.auth = auth
+        session.verify = verify
+        _sessions[name] = session
+        return session
+
+
+def pool_stats():
+    stats = {}
+    with _sessions_lock:
+        sessions = dict(_sessions)
+    for name, session in sessions.items():
+        adapters = {id(adapter): adapter for adapter in session.adapters.values()
+                    if isinstance(adapter, PooledHTTPAdapter)}
+        totals = {"requests": 0, "pool_misses": 0, "pool_hits": 0}
+        for adapter in adapters.values():
+            for key, value in adapter.pool_stats().items():
+                totals[key] += value
+        stats[name] = totals
+    return stats
+
+
+def close_sessions():
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+
+class RateLimiter:
+    # Spaces out work so the overall rate stays at units_per_second (OpenAI requests in a batch run,
+    # HEC events in generate_fake_splunk_logs.py); a falsy rate means unlimited
+    def __init__(self, units_per_second):
+        self.units_per_second = units_per_second
+        self.next_send = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, units=1):
+        if not self.units_per_second:
+            return
+        with self.lock:
+            now = time.monotonic()
+            send_at = max(self.next_send, now)
+            self.next_send = send_at + units / self.units_per_second
+        if send_at > now:
+            time.sleep(send_at - now)
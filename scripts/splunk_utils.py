@@ -19,7 +19,7 @@ SPLUNK_HEALTH_ENDPOINT = f"{SPLUNK_URL}/services/server/info"
 
 
 
-def wait_for_splunk(timeout=120, interval=5):
+def wait_for_splunk(timeout=120, interval=2):
     print("Waiting for Splunk to be ready...")
     start_time = time.time()
 
@@ -44,6 +44,43 @@ def wait_for_splunk(timeout=120, interval=5):
     raise Exception("Splunk did not become ready in time.")
 
 
+def is_splunk_ready(timeout=2):
+    # A single quick probe, so startup can skip the container start when Splunk is already up
+    try:
+        response = requests.get(
+            SPLUNK_HEALTH_ENDPOINT,
+            auth=HTTPBasicAuth(SPLUNK_USERNAME, SPLUNK_PASSWORD),
+            verify=False,
+            timeout=timeout
+        )
+        return response.status_code == 200 and "<feed" in response.text
+    except requests.exceptions.RequestException:
+        return False
+
+
+def has_recent_events(index, earliest, timeout=10):
+    # Pass splunk_index and splunk_earliest from config.yaml: the app only searches there, so seed data
+    # in another index or older than the window does not count
+    try:
+        response = requests.post(
+            f"{SPLUNK_URL}/services/search/jobs",
+            auth=HTTPBasicAuth(SPLUNK_USERNAME, SPLUNK_PASSWORD),
+            data={
+                "search": f'search index={index} sourcetype="splunk_logs" earliest={earliest} | head 1 | stats count',
+                "exec_mode": "oneshot",
+                "output_mode": "json"
+            },
+            verify=False,
+            timeout=timeout
+        )
+        response.raise_for_status()
+        results = response.json().get("results", [])
+        return bool(results) and int(results[0].get("count", 0)) > 0
+    except (requests.exceptions.RequestException, ValueError) as e:
+        print(f"Could not check for existing Splunk events: {e}")
+        return False
+
+
 def create_splunk_token():
     print("Creating Splunk token (using basic auth)...")
 
@@ -1,22 +1,42 @@
 import sys
 import os
 import subprocess  # Missing import
+import time
+
+import yaml
 
 # First add the scripts directory to Python path
 sys.path.append(os.path.abspath(os.path.dirname(__file__)))
 
 # Then import from splunk_utils
-from splunk_utils import wait_for_splunk
+from splunk_utils import has_recent_events, is_splunk_ready, wait_for_splunk
+from http_pool import CONFIG_PATH
+
+
+def load_search_window():
+    # The index and time window the app searches, so seeding is skipped only when that data is there
+    with open(CONFIG_PATH, "r") as f:
+        config = yaml.safe_load(f) or {}
+    return config.get("splunk_index", "main"), config.get("splunk_earliest", "-24h")
+
 
 def start_dependencies():
-    print("Starting Splunk container using Docker Compose...")
-    subprocess.run(["docker-compose", "-f", "./docker/docker-compose.yml", "up", "-d"], check=True)
-    wait_for_splunk()
+    started = time.perf_counter()
+    # A healthy, already seeded Splunk (e.g. after a Streamlit restart) needs neither step
+    if is_splunk_ready():
+        print("Splunk is already running.")
+    else:
+        print("Starting Splunk container using Docker Compose...")
+        subprocess.run(["docker-compose", "-f", "./docker/docker-compose.yml", "up", "-d"], check=True)
+        wait_for_splunk()
 
-    print("Generating fake Splunk logs...")
-    subprocess.run(["python3", "scripts/generate_fake_splunk_logs.py"], check=True)
+    if has_recent_events(*load_search_window()):
+        print("Fake Splunk logs are already loaded.")
+    else:
+        print("Generating fake Splunk logs...")
+        subprocess.run(["python3", "scripts/generate_fake_splunk_logs.py"], check=True)
 
-    print("Dependencies started successfully.")
+    print(f"Dependencies started successfully in {time.perf_counter() - started:.2f}s.")
 
 if __name__ == "__main__":
     start_dependencies()
\ No newline at end of file
@@ -0,0 +1,25 @@
+import argparse
+import os
+import sys
+
+# Add the root directory to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.query_app import RUNBOOK_INDEX_CONFIG, sync_confluence_runbook_index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incrementally sync the local runbook index from Confluence.")
+    parser.add_argument("--space", default=RUNBOOK_INDEX_CONFIG.get("space_key"), help="Confluence space key")
+    parser.add_argument("--index-dir", default=RUNBOOK_INDEX_CONFIG.get("path", ".cache/runbook_index"))
+    args = parser.parse_args()
+
+    if not args.space:
+        parser.error("a Confluence space key is required (--space or runbook_index.space_key in config.yaml)")
+
+    stats = sync_confluence_runbook_index(args.space, args.index_dir)
+    print(f"Indexed {stats['pages']} pages ({stats['fetched']} fetched, {stats['removed']} removed)")
+
+
+if __name__ == "__main__":
+    main()
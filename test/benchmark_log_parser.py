@@ -0,0 +1,52 @@
+import json
+import os
+import random
+import re
+import sys
+import time
+
+# Make the app and scripts modules importable
+root_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(root_dir, 'app'))
+sys.path.append(os.path.join(root_dir, 'scripts'))
+
+from log_fields import extract_service_and_error_code, parse_log_line
+from generate_fake_splunk_logs import SPLUNK_LOGS, build_log_event
+
+LINE_COUNT = int(os.getenv("BENCHMARK_LINES", "200000"))
+
+
+def previous_extract_log_fields(line):
+    # query_app.extract_log_fields as it was before log_fields: two uncompiled searches per field
+    fields = {}
+    fields["service"] = re.search(r'service=(\w+)', line).group(1) if re.search(r'service=(\w+)',
+                                                                                line) else None
+    fields["error_code"] = re.search(r'error_code=(\w+)', line).group(1) if re.search(r'error_code=(\w+)',
+                                                                                      line) else None
+    return fields
+
+
+def time_parser(name, parse, lines):
+    started = time.perf_counter()
+    for line in lines:
+        parse(line)
+    elapsed = time.perf_counter() - started
+    print(f"{name:<40} {len(lines) / elapsed:>12,.0f} lines/sec")
+
+
+def main():
+    random.seed(1)
+    templates = [line for logs in SPLUNK_LOGS for line in logs]
+    plain_lines = [random.choice(templates) for _ in range(LINE_COUNT)]
+    # What Splunk returns in _raw for events sent through HEC
+    hec_lines = [json.dumps(build_log_event(line)["event"]) for line in plain_lines]
+
+    print(f"Parsing {LINE_COUNT:,} lines")
+    for label, lines in (("plain", plain_lines), ("HEC _raw", hec_lines)):
+        time_parser(f"previous extract_log_fields ({label})", previous_extract_log_fields, lines)
+        time_parser(f"extract_service_and_error_code ({label})", extract_service_and_error_code, lines)
+        time_parser(f"parse_log_line, all fields ({label})", parse_log_line, lines)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+import argparse
+import concurrent.futures
+import contextvars
+import functools
+import json
+import logging
+import math
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Set up file paths
+script_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.abspath(os.path.join(script_dir, '..'))
+input_file_path = os.path.join(script_dir, 'input.json')
+output_file_path = os.path.join(script_dir, 'benchmark_results.json')
+
+sys.path.append(root_dir)
+sys.path.append(os.path.join(root_dir, 'scripts'))
+
+from generate_fake_splunk_logs import SPLUNK_LOGS
+
+STAGES = ["keywords", "splunk", "confluence", "answer"]
+ERROR_CODE_PATTERN = re.compile(r"[A-Z][A-Z0-9]*(?:_[A-Z0-9]+)+")
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def read_body(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return self.rfile.read(length).decode("utf-8") if length else ""
+
+    def send_json(self, payload, status=200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class FakeSplunkHandler(StubHandler):
+    # /services/search/jobs: job creation (normal, blocking, oneshot), status, results, control and export
+    jobs = {}
+    job_duration = 0.05
+
+    def matching_results(self, search):
+        codes = set(ERROR_CODE_PATTERN.findall(search)) - {"ERROR"}
+        lines = [line for logs in SPLUNK_LOGS for line in logs if "level=ERROR" in line]
+        matches = [line for line in lines if any(f"error_code={code}" in line for code in codes)]
+        if "list(trace_event)" in search:
+            return self.trace_results(search, matches or lines[:1])
+        return [{"_time": time.time(), "_raw": line} for line in (matches or lines)[:1]]
+
+    @staticmethod
+    def trace_results(search, error_lines):
+        # The trace query's stats output: every event of the error's correlation_id, 0.2s apart
+        requested = re.findall(r'correlation_id="([^"]+)"', search)
+        correlation_ids = requested or re.findall(r"correlation_id=(\S+)", error_lines[0])
+        rows = []
+        for correlation_id in correlation_ids[:1]:
+            chain = [line for logs in SPLUNK_LOGS for line in logs if f"correlation_id={correlation_id}" in line]
+            started = time.time() - 0.2 * len(chain)
+            rows.append({"correlation_id": correlation_id, "event_count": str(len(chain)),
+                         "events": [f"{started + 0.2 * position:.3f}|{line}" for position, line in enumerate(chain)]})
+        return rows
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        form = {key: values[0] for key, values in parse_qs(self.read_body()).items()}
+        if path.endswith("/control"):
+            return self.send_json({"messages": []})
+        if path.endswith("/export"):
+            body = "".join(json.dumps({"preview": False, "result": row}) + "\n"
+                           for row in self.matching_results(form.get("search", "")))
+            time.sleep(self.job_duration)
+            return self.send_json_lines(body)
+
+        exec_mode = form.get("exec_mode", "normal")
+        results = self.matching_results(form.get("search", ""))
+        if exec_mode == "oneshot":
+            time.sleep(self.job_duration)
+            return self.send_json({"results": results})
+        sid = form.get("id") or uuid.uuid4().hex
+        self.jobs[sid] = {"done_at": time.monotonic() + self.job_duration, "results": results}
+        if exec_mode == "blocking":
+            time.sleep(self.job_duration)
+        self.send_json({"sid": sid})
+
+    def send_json_lines(self, body):
+        data = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        parts = urlparse(self.path).path.rstrip("/").split("/")
+        if parts[-1] == "results":
+            job = self.jobs.get(parts[-2], {"results": []})
+            offset = int(parse_qs(urlparse(self.path).query).get("offset", ["0"])[0])
+            return self.send_json({"results": job["results"][offset:]})
+        job = self.jobs.get(parts[-1])
+        if job is None:
+            return self.send_json({"messages": [{"text": "Unknown sid"}]}, status=404)
+        is_done = time.monotonic() >= job["done_at"]
+        self.send_json({"entry": [{"content": {"isDone": is_done, "runDuration": self.job_duration}}]})
+
+
+class FakeConfluenceHandler(StubHandler):
+    # /wiki/rest/api/content/search and /content/{id}, one runbook page per error code
+    search_delay = 0.1
+
+    @staticmethod
+    def runbook_page(code):
+        steps = "".join(f"<li>Step {i} for resolving {code}.</li>" for i in range(1, 6))
+        return {
+            "id": str(abs(hash(code)) % 10 ** 8),
+            "title": f"Error Resolution Guide: {code}",
+            "version": {"number": 1},
+            "body": {"storage": {"value": f"<h2>Resolution</h2><ol>{steps}</ol>"}},
+            "_links": {"base": "http://confluence.local/wiki", "webui": f"/spaces/OM/pages/{code}"},
+        }
+
+    def do_GET(self):
+        time.sleep(self.search_delay)
+        parsed = urlparse(self.path)
+        if parsed.path.endswith("/content/search"):
+            cql = parse_qs(parsed.query).get("cql", [""])[0]
+            codes = sorted(set(ERROR_CODE_PATTERN.findall(cql)) - {"ERROR"})
+            return self.send_json({"results": [self.runbook_page(code) for code in codes]})
+        return self.send_json(self.runbook_page(parsed.path.rsplit("/", 1)[-1]))
+
+
+class FakeOpenAIHandler(StubHandler):
+    # /v1/chat/completions with a fixed delay per call, plain or streamed as server-sent events
+    completion_delay = 0.5
+    keyword_answer = {"services": ["parser"], "errors": ["JSON_SYNTAX_ERROR"], "correlation_id": [],
+                      "endpoints": []}
+
+    def do_POST(self):
+        request = json.loads(self.read_body() or "{}")
+        prompt = request.get("messages", [{}])[-1].get("content", "")
+        content = (json.dumps(self.keyword_answer) if "Extract the following structured information" in prompt
+                   else "1. Check the runbook steps.\n2. Apply the resolution.")
+        usage = {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4,
+                 "total_tokens": (len(prompt) + len(content)) // 4}
+        time.sleep(self.completion_delay)
+        base = {"id": "chatcmpl-bench", "created": int(time.time()), "model": request.get("model", "gpt-3.5-turbo")}
+
+        if not request.get("stream"):
+            return self.send_json(dict(base, object="chat.completion", usage=usage, choices=[{
+                "index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}]))
+
+        # Word-sized deltas that keep their whitespace, so the joined stream equals content
+        chunks = [dict(base, object="chat.completion.chunk", choices=[{
+            "index": 0, "finish_reason": None, "delta": {"content": word}}]) for word in re.findall(r"\S+\s*", content)]
+        body = "".join(f"data: {json.dumps(chunk)}\n\n" for chunk in chunks) + "data: [DONE]\n\n"
+        data = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def start_server(handler):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(math.ceil(pct / 100 * len(ordered)) - 1, 0)]
+
+
+def summarize(values):
+    return {
+        "count": len(values),
+        "p50_ms": round(percentile(values, 50) * 1000, 2) if values else None,
+        "p95_ms": round(percentile(values, 95) * 1000, 2) if values else None,
+        "p99_ms": round(percentile(values, 99) * 1000, 2) if values else None,
+        "mean_ms": round(sum(values) / len(values) * 1000, 2) if values else None,
+    }
+
+
+# The current request's stage totals; threads started with a copy of the request's context (the Confluence
+# prefetch) add to the same dict
+stage_timings = contextvars.ContextVar("stage_timings", default=None)
+stage_timings_lock = threading.Lock()
+
+
+def instrument(module, stage_name, function_name):
+    # Wraps a query_app function so every call adds its duration to the current request's stage total
+    original = getattr(module, function_name)
+
+    @functools.wraps(original)
+    def timed(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return original(*args, **kwargs)
+        finally:
+            current = stage_timings.get()
+            if current is not None:
+                with stage_timings_lock:
+                    current[stage_name] = current.get(stage_name, 0.0) + time.perf_counter() - started
+
+    setattr(module, function_name, timed)
+
+
+def run_benchmark(args):
+    FakeSplunkHandler.job_duration = args.splunk_delay
+    FakeConfluenceHandler.search_delay = args.confluence_delay
+    FakeOpenAIHandler.completion_delay = args.openai_delay
+    servers = [start_server(FakeSplunkHandler), start_server(FakeConfluenceHandler), start_server(FakeOpenAIHandler)]
+    (_, splunk_url), (_, confluence_url), (_, openai_url) = servers
+
+    # Cache and index paths in config/config.yaml are relative to the repo root; secrets come from the environment
+    os.chdir(root_dir)
+    os.environ["OPENAI_API_KEY"] = "benchmark"
+    os.environ["CONFLUENCE_API_TOKEN"] = "benchmark"
+    os.environ["OPENAI_BASE_URL"] = f"{openai_url}/v1"
+    from app import query_app
+
+    if not args.verbose:
+        logging.disable(logging.INFO)
+    query_app.SPLUNK_URL = f"{splunk_url}/services/search/jobs"
+    query_app.CONFLUENCE_BASE_URL = f"{confluence_url}/wiki/rest/api"
+    query_app.LOG_BACKEND = "splunk"
+    query_app.SPLUNK_EXEC_MODE = args.splunk_exec_mode
+    query_app.SPLUNK_TRACE_CONFIG = dict(query_app.SPLUNK_TRACE_CONFIG, mode=args.trace_mode)
+    query_app.CONFLUENCE_PREFETCH = args.confluence_prefetch
+    if args.llm_keywords:
+        query_app.KEYWORD_FAST_PATH_MIN_CONFIDENCE = float("inf")
+    if args.no_cache:
+        query_app.response_cache.ttl = 0
+        query_app.confluence_cache = None
+        query_app.SEMANTIC_CACHE_CONFIG = dict(query_app.SEMANTIC_CACHE_CONFIG, enabled=False)
+
+    for stage, function_name in (("keywords", "extract_keywords"),
+                                 ("splunk", "extract_matching_logs_from_splunk"),
+                                 ("splunk", "extract_log_timelines"),
+                                 ("confluence", "query_confluence_for_keywords"),
+                                 ("answer", "generate_response")):
+        instrument(query_app, stage, function_name)
+
+    with open(input_file_path, "r") as file:
+        questions = json.load(file)["questions"] * args.repeat
+
+    def run_question(question):
+        timings = {}
+        token = stage_timings.set(timings)
+        started = time.perf_counter()
+        error = None
+        try:
+            query_app.process_user_query(question)
+        except Exception as e:
+            error = str(e)
+        finally:
+            stage_timings.reset(token)
+        return time.perf_counter() - started, timings, error
+
+    started = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        outcomes = list(executor.map(run_question, questions))
+    wall_time = time.perf_counter() - started
+
+    errors = [error for _, _, error in outcomes if error]
+    report = {
+        "settings": {key: value for key, value in vars(args).items() if key != "output"},
+        "questions": len(questions),
+        "errors": len(errors),
+        "sample_errors": errors[:5],
+        "wall_time_s": round(wall_time, 3),
+        "throughput_qps": round(len(questions) / wall_time, 2),
+        "end_to_end": summarize([elapsed for elapsed, _, error in outcomes if not error]),
+        "stages": {stage: summarize([stages[stage] for _, stages, error in outcomes if not error and stage in stages])
+                   for stage in STAGES},
+    }
+
+    for server, _ in servers:
+        server.shutdown()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark process_user_query against local stand-in services.")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=1, help="replay test/input.json this many times")
+    parser.add_argument("--splunk-delay", type=float, default=0.05, help="seconds until a fake Splunk job is done")
+    parser.add_argument("--confluence-delay", type=float, default=0.1, help="seconds per fake CQL search")
+    parser.add_argument("--openai-delay", type=float, default=0.5, help="seconds per fake chat completion")
+    parser.add_argument("--splunk-exec-mode", default="normal", choices=["normal", "blocking", "oneshot", "export"])
+    parser.add_argument("--trace-mode", default="auto", choices=["auto", "always", "off"],
+                        help="when to fetch the whole correlation_id event chain instead of one event")
+    parser.add_argument("--confluence-prefetch", action="store_true",
+                        help="look up runbooks for the question's own terms while the Splunk job runs")
+    parser.add_argument("--llm-keywords", action="store_true", help="always extract keywords with the LLM")
+    parser.add_argument("--no-cache", action="store_true", help="disable the answer and Confluence caches")
+    parser.add_argument("--verbose", action="store_true", help="keep the app's INFO logging")
+    parser.add_argument("--output", default=output_file_path, help="where to write the JSON report")
+    args = parser.parse_args()
+
+    report = run_benchmark(args)
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=4)
+
+    print(f"{report['questions']} questions, {report['errors']} errors, {report['throughput_qps']} queries/sec")
+    print(f"{'stage':<12}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for stage, summary in list(report["stages"].items()) + [("end_to_end", report["end_to_end"])]:
+        print(f"{stage:<12}{summary['p50_ms'] or '-':>10}{summary['p95_ms'] or '-':>10}{summary['p99_ms'] or '-':>10}")
+    print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Set up file paths
+script_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.abspath(os.path.join(script_dir, '..'))
+
+# Runs in a fresh interpreter each time so every sample is a cold import
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+sys.path.append({root_dir!r})
+import app.query_app as query_app
+imported = time.perf_counter()
+timings = {{"import_s": imported - started}}
+if {with_client!r}:
+    query_app.get_openai_client()
+    timings["openai_client_s"] = time.perf_counter() - imported
+print(json.dumps(timings))
+"""
+
+
+def measure_once(with_client):
+    env = dict(os.environ)
+    env.setdefault("OPENAI_API_KEY", "startup-benchmark")
+    env.setdefault("CONFLUENCE_API_TOKEN", "startup-benchmark")
+    output = subprocess.run([sys.executable, "-c", PROBE.format(root_dir=root_dir, with_client=with_client)],
+                            capture_output=True, text=True, check=True, env=env)
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold-start time of app.query_app.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--with-client", action="store_true", help="also time creating the OpenAI client")
+    parser.add_argument("--budget", type=float, default=1.0, help="seconds a cold import may take")
+    args = parser.parse_args()
+
+    samples = [measure_once(args.with_client) for _ in range(args.runs)]
+    for key in samples[0]:
+        values = [sample[key] for sample in samples]
+        print(f"{key:<16} median {statistics.median(values):.3f}s  min {min(values):.3f}s  max {max(values):.3f}s")
+
+    median_import = statistics.median(sample["import_s"] for sample in samples)
+    if median_import > args.budget:
+        print(f"Cold import takes {median_import:.3f}s, over the {args.budget:.1f}s budget")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
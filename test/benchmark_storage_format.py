@@ -0,0 +1,79 @@
+import argparse
+import os
+import re
+import statistics
+import sys
+import time
+
+# Set up file paths
+script_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.abspath(os.path.join(script_dir, '..', 'app')))
+
+from storage_format import (StorageFormatParser, extract_sections, parse_named_sections, parse_storage_format,
+                            render_sections)
+
+
+def regex_strip(body_html):
+    # The tag-stripping extractor query_app used before the storage-format parser
+    return re.sub('<[^<]+?>', '', body_html).strip().replace("\n", " ")
+
+
+def build_runbook_page(sections):
+    # A long runbook in Confluence storage format: prose, nested lists, macros, code and tables
+    parts = ["<h1>Error Resolution Guide: JSON_SYNTAX_ERROR</h1>",
+             "<p>Raised by the <strong>parser</strong> service when&nbsp;the input is malformed.</p>"]
+    for i in range(sections):
+        parts.append(f"<h2>Background {i}</h2><p>{'Context about upstream systems and data flow. ' * 20}</p>")
+        parts.append('<ac:structured-macro ac:name="info"><ac:parameter ac:name="title">Note</ac:parameter>'
+                     f"<ac:rich-text-body><p>Known issue #{i} affects nightly batches.</p></ac:rich-text-body>"
+                     "</ac:structured-macro>")
+        parts.append("<table><tbody>" + "".join(f"<tr><td>host-{j}</td><td>region-{j % 3}</td></tr>"
+                                                 for j in range(10)) + "</tbody></table>")
+    parts.append("<h2>Resolution</h2><ol>" + "".join(
+        f"<li><p>Step {i}: check the <code>parser</code> output.</p></li>" for i in range(1, 11)) +
+        '<li>Validate the file:<ac:structured-macro ac:name="code"><ac:parameter ac:name="language">bash'
+        "</ac:parameter><ac:plain-text-body><![CDATA[jq . input.json > /dev/null && echo ok]]>"
+        "</ac:plain-text-body></ac:structured-macro></li></ol>")
+    return "".join(parts)
+
+
+def time_call(func, runs):
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = func()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the storage-format parser with the old tag-stripping regex.")
+    parser.add_argument("--sizes", default="10,100,1000", help="comma-separated numbers of background sections")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--chunk-size", type=int, default=8192, help="chunk size for the streaming run")
+    args = parser.parse_args()
+
+    # sections ms is what query_app pays per page: only the Resolution section goes through the parser
+    print(f"{'page KB':>8}{'regex ms':>10}{'parse ms':>10}{'stream ms':>11}{'sections ms':>13}{'regex chars':>13}"
+          f"{'full chars':>12}{'resolution chars':>18}")
+    for sections in (int(size) for size in args.sizes.split(",")):
+        body_html = build_runbook_page(sections)
+        regex_time, regex_text = time_call(lambda: regex_strip(body_html), args.runs)
+        parse_time, parsed = time_call(lambda: parse_storage_format(body_html), args.runs)
+
+        def stream():
+            stream_parser = StorageFormatParser()
+            for start in range(0, len(body_html), args.chunk_size):
+                stream_parser.feed(body_html[start:start + args.chunk_size])
+            return stream_parser.close()
+
+        stream_time, _ = time_call(stream, args.runs)
+        sections_time, _ = time_call(lambda: parse_named_sections(body_html), args.runs)
+        full_text = render_sections(parsed)
+        resolution_text = render_sections(extract_sections(parsed))
+        print(f"{len(body_html) / 1024:>8.0f}{regex_time * 1000:>10.2f}{parse_time * 1000:>10.2f}"
+              f"{stream_time * 1000:>11.2f}{sections_time * 1000:>13.2f}{len(regex_text):>13}{len(full_text):>12}{len(resolution_text):>18}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+import concurrent.futures
+import os
+import sys
+import threading
+import time
+
+# Make the app modules importable
+root_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(root_dir, 'app'))
+
+import query_app
+from resilience import CircuitBreaker, CircuitOpen, hedged_call, is_degraded, mark_degraded, track_degraded
+from response_cache import LookupMemo
+
+
+def failing():
+    raise ConnectionError("backend down")
+
+
+def streaming(items, fail_at=None):
+    def results():
+        for i, item in enumerate(items):
+            if i == fail_at:
+                raise ConnectionError("stream broke")
+            yield item
+    return results(), "sid"
+
+
+def open_breaker(reset_timeout=0.05):
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=reset_timeout)
+    for _ in range(2):
+        try:
+            breaker.call(failing)
+        except ConnectionError:
+            pass
+    assert breaker.state == "open"
+    return breaker
+
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = open_breaker(reset_timeout=60)
+    try:
+        breaker.call(lambda: "ok")
+        assert False, "call went through an open circuit"
+    except CircuitOpen as error:
+        assert error.backend == "test" and error.retry_after > 0
+
+
+def test_breaker_opens_on_slow_calls():
+    breaker = CircuitBreaker("test", slow_call_seconds=0.01, slow_call_rate=0.5, min_calls=3)
+    for _ in range(3):
+        breaker.call(time.sleep, 0.02)
+    assert breaker.state == "open"
+
+
+def test_half_open_trial_closes_or_reopens():
+    breaker = open_breaker()
+    time.sleep(0.06)
+    assert breaker.call(lambda: "ok") == "ok"
+    assert breaker.state == "closed"
+
+    breaker = open_breaker()
+    time.sleep(0.06)
+    try:
+        breaker.call(failing)
+    except ConnectionError:
+        pass
+    assert breaker.state == "open" and breaker.trips == 2
+
+
+def test_only_one_trial_call_while_half_open():
+    breaker = open_breaker(reset_timeout=0.2)
+    time.sleep(0.25)
+    assert breaker.allow()
+    assert not breaker.allow()
+
+
+def test_streaming_call_is_recorded_when_results_run_out_or_fail():
+    breaker = CircuitBreaker("test", failure_threshold=1)
+    results, sid = breaker.call_streaming(streaming, [1, 2, 3])
+    assert sid == "sid" and breaker.stats()["recent_calls"] == 0
+    assert list(results) == [1, 2, 3]
+    assert breaker.stats()["recent_calls"] == 1 and breaker.state == "closed"
+
+    results, _ = breaker.call_streaming(streaming, [1, 2, 3], 1)
+    try:
+        list(results)
+    except ConnectionError:
+        pass
+    assert breaker.state == "open"
+
+
+def test_unread_streaming_trial_expires():
+    # The trial's results are dropped before the first next(), so it is never recorded
+    breaker = open_breaker()
+    time.sleep(0.06)
+    results, _ = breaker.call_streaming(streaming, [1])
+    del results
+    assert not breaker.allow()
+    time.sleep(0.06)
+    assert breaker.call(lambda: "ok") == "ok"
+    assert breaker.state == "closed"
+
+
+def test_hedge_wins_when_primary_is_slow():
+    calls = []
+    lock = threading.Lock()
+
+    def lookup():
+        with lock:
+            calls.append(len(calls))
+            first = len(calls) == 1
+        time.sleep(0.5 if first else 0.01)
+        return "primary" if first else "hedge"
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+        assert hedged_call(executor, 0.05, lookup) == "hedge"
+        assert hedged_call(executor, 1.0, lambda: "fast") == "fast"
+
+
+def test_hedge_error_raised_only_when_both_fail():
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+        try:
+            hedged_call(executor, 0.01, lambda: (time.sleep(0.02), failing()))
+            assert False, "expected the lookup error"
+        except ConnectionError:
+            pass
+
+
+def test_memo_does_not_keep_failed_lookups():
+    memo = LookupMemo()
+    outcomes = iter([("logs", frozenset({"splunk"})), ("logs", frozenset())])
+    remember = lambda outcome: not outcome[1]
+    assert memo.get_or_run("q", lambda: next(outcomes), remember=remember)[1] == {"splunk"}
+    assert memo.get_or_run("q", lambda: next(outcomes), remember=remember)[1] == frozenset()
+    assert memo.get_or_run("q", failing, remember=remember)[1] == frozenset()
+    assert memo.stats()["hits"] == 1
+
+
+def test_shared_degraded_lookup_marks_every_caller():
+    started = threading.Event()
+
+    def lookup():
+        started.wait(1)
+        time.sleep(0.05)
+        mark_degraded("splunk")
+        return "fallback logs"
+
+    def ask():
+        with track_degraded():
+            return query_app.batch_lookup("q", lookup), is_degraded("splunk")
+
+    query_app.batch_lookups = LookupMemo()
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+            futures = [executor.submit(ask) for _ in range(2)]
+            started.set()
+            assert [future.result() for future in futures] == [("fallback logs", True)] * 2
+        assert query_app.batch_lookups.stats()["entries"] == 0
+    finally:
+        query_app.batch_lookups = None
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"{name}: ok")
@@ -0,0 +1,72 @@
+import os
+import sys
+import time
+
+# Make the app modules importable
+root_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(root_dir, 'app'))
+
+from keyword_extractor import KeywordExtractor
+from semantic_cache import SemanticCache
+
+# The keyword_vocabulary of config/config.yaml
+VOCABULARY = {
+    "services": ["MandateService", "parser"],
+    "errors": ["DB_CONNECTION_TIMEOUT", "FILE_FETCH_TIMEOUT", "JSON_SYNTAX_ERROR", "NullPointerException",
+               "UNCAUGHT_EXCEPTION", "XML_SYNTAX_ERROR"],
+}
+
+
+def cache_with(question, answer="cached answer", ttl=300):
+    cache = SemanticCache(ttl=ttl, keyword_extractor=KeywordExtractor(VOCABULARY))
+    cache.put(question, answer)
+    return cache
+
+
+def test_reworded_question_is_served():
+    cache = cache_with("How do I fix DB_CONNECTION_TIMEOUT in the parser?")
+    match = cache.get("how to resolve db_connection_timeout in parser")
+    assert match is not None and match["answer"] == "cached answer"
+
+
+def test_error_code_served_for_its_description():
+    # In both directions: the cached question names the code, or only describes it
+    assert cache_with("parser JSON error").get("JSON_SYNTAX_ERROR in Parser Service") is not None
+    assert cache_with("JSON_SYNTAX_ERROR in Parser Service").get("parser JSON error") is not None
+
+
+def test_different_service_is_not_served():
+    cache = cache_with("How do I fix DB_CONNECTION_TIMEOUT in the parser?")
+    assert cache.get("How do I fix DB_CONNECTION_TIMEOUT in the mandate service?") is None
+    assert cache.get("How do I fix DB_CONNECTION_TIMEOUT in MandateService?") is None
+    assert cache.get("How do I fix DB_CONNECTION_TIMEOUT?") is None
+    assert cache.stats()["rejected"] > 0
+
+
+def test_unnamed_error_is_not_served_a_specific_one():
+    cache = cache_with("How do I fix the JSON_SYNTAX_ERROR in the parser service?")
+    assert cache.get("How do I fix the error in the parser service?") is None
+    cache = cache_with("How do I fix the error in the parser service?")
+    assert cache.get("How do I fix the JSON_SYNTAX_ERROR in the parser service?") is None
+
+
+def test_different_error_code_or_correlation_id_is_not_served():
+    cache = cache_with("JSON_SYNTAX_ERROR in parser")
+    assert cache.get("XML_SYNTAX_ERROR in parser") is None
+    cache = cache_with("What happened to err001 in the parser?")
+    assert cache.get("What happened to err002 in the parser?") is None
+
+
+def test_expired_answer_is_not_served():
+    # query_app gives the cache the answer cache's TTL; an identical question must not outlive it
+    cache = cache_with("How do I fix DB_CONNECTION_TIMEOUT in the parser?", ttl=0.05)
+    assert cache.get("How do I fix DB_CONNECTION_TIMEOUT in the parser?") is not None
+    time.sleep(0.1)
+    assert cache.get("How do I fix DB_CONNECTION_TIMEOUT in the parser?") is None
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"{name}: ok")